@@ -1,98 +1,150 @@
-import functools
-import aprslib
 import asyncio
-import re 
-import logging
+import time
 
-from RingDict import RingDict 
+from AckRegistry import AckRegistry
+from AckScheduler import AckScheduler
+from TokenBucket import TokenBucket
+from StationRegistry import StationRegistry, Station
+from PacketFilter import PacketFilter
+from Transport import DryRunTransport
+import FrameEncoder
+import Metrics
+import Log
+
+log = Log.getLogger("aprs")
+
+class Delivery:
+    #how a message went: how many of its parts were ACKed, out of how many. Truthy if all of them.
+    __slots__ = ("acked", "parts")
+
+    def __init__(self, acked: int, parts: int):
+        self.acked = acked
+        self.parts = parts
+
+    def __bool__(self):
+        return self.acked == self.parts
+
+    def __repr__(self):
+        return "Delivery("+str(self.acked)+"/"+str(self.parts)+")"
 
 class APRSClient:
-    lastHeard = RingDict(size=10)
-    #    "AD8IS-10": {
-    #        "msgNo":10,            #the last msgNo received from this client (which we ACKed)
-    #        "acks":{34,35,36}      #a set (no dupes) of acks received from this client (for messages we sent)
-    #        "nextMsgNo":1          #the next message number to use with this client
-    #        }
-    #    }
-
-    def __init__(self, packetQueue, botCall):
+    def __init__(self, packetQueue, botCall, txRate: float = 2, txBurst: float = 5, stations=None, maxStations: int = 1000, addressees=None, transport=None, ackRate: float = 1, ackBurst: float = 3, partWindow: int = 2):
         self.botCall = botCall
         self.packetQueue = packetQueue
+        self.packetFilter = PacketFilter(addressees or [botCall]) #every callsign we answer to
+        self.stations = stations if stations is not None else StationRegistry(size=maxStations) #shared with DiscordClient
+        self.pendingAcks = AckRegistry() #futures for messages we've sent, resolved when the ACK comes in
+        self.txBudget = TokenBucket(txRate, txBurst) #every packet we transmit, messages and ACKs alike
+        self.transport = transport or DryRunTransport() #nothing goes on air unless we're told to
+        self.acks = AckScheduler(self._transmit, rate=ackRate, burst=ackBurst) #our ACKs (and their double-taps)
+        self.partWindow = partWindow #how many parts of a long message may wait on ACKs at once
 
-    async def _checkRx(self, toCall, msgNo) -> bool:
-        #await this with a timeout
-        #it will poll on lastHeard to see if a client has ACKed a msgNo.
-        while True:
-            await asyncio.sleep(1)
-            if toCall in self.lastHeard and "acks" in self.lastHeard[toCall] and msgNo in self.lastHeard[toCall]["acks"]:
-                return True
+    async def _transmit(self, pkt: bytes, label: str = "Sent"):
+        await self.txBudget.take()
+        if await self.transport.send(pkt) is False:
+            log.info("%s (held until APRS-IS is back): %s", label, pkt, extra={"transport": self.transport.name})
+        else:
+            log.info("%s: %s", label, pkt, extra={"transport": self.transport.name})
 
-    def sanitize_aprs_msg(self, message) -> str:
-        return re.sub(r'[{:]','',message).encode('ascii','ignore').decode('ascii')[:67] #sanitize
-    
-    async def send_aprs_msg(self, toCall: str, message: str, fromCall: str = None) -> bool: 
+    def station(self, callsign: str) -> Station:
+        return self.stations.get(callsign)
+
+    def saveStation(self, callsign: str):
+        self.stations.save(self.station(callsign))
+
+    def handle_ack(self, fromCall, msgNo) -> bool:
+        #call this when an ACK is parsed; it wakes up whoever is waiting in send_aprs_msg
+        return self.pendingAcks.resolve(fromCall, msgNo)
+
+    def handle_rej(self, fromCall, msgNo) -> bool:
+        #the station refused the message; no point in retrying it
+        return self.pendingAcks.resolve(fromCall, msgNo, acked=False)
+
+    async def send_aprs_msg(self, toCall: str, message: str, fromCall: str = None) -> Delivery: 
+        #a message too long for one frame goes as numbered parts. They're transmitted in order, but
+        #the next one doesn't wait for the last one's ACK, only for a place in the window.
+        parts = FrameEncoder.split(message)
+        if len(parts) == 1:
+            return Delivery(int(await self.send_aprs_frame(toCall, parts[0], fromCall)), 1)
+        window = asyncio.Semaphore(self.partWindow)
+        async def sendPart(part):
+            async with window:
+                return await self.send_aprs_frame(toCall, part, fromCall)
+        #tasks start in the order they're made, so the parts get their msgNos in order too
+        acked = await asyncio.gather(*[sendPart(part) for part in parts])
+        log.info("%d of %d parts were acknowledged", sum(acked), len(parts), extra={"station": toCall})
+        return Delivery(sum(acked), len(parts))
 
+    async def send_aprs_notice(self, toCall: str, message: str, fromCall: str = None):
+        #transmitted once, and nobody waits for the ACK: for when we're on our way out
         if not fromCall:
             fromCall = self.botCall
+        msgNo = self.station(toCall).takeMsgNo()
+        self.saveStation(toCall)
+        await self._transmit(FrameEncoder.message(fromCall, toCall, FrameEncoder.split(message)[0], msgNo))
 
-        if toCall in self.lastHeard and "nextMsgNo" in self.lastHeard[toCall]:
-            msgNo = self.lastHeard[toCall]["nextMsgNo"]
-        else:
-            msgNo = 1
+    async def send_aprs_frame(self, toCall: str, text: bytes, fromCall: str = None) -> bool:
+        #text is one frame's worth, from FrameEncoder.split()
 
-        if not toCall in self.lastHeard:
-            self.lastHeard.update({toCall:{"nextMsgNo":msgNo+1}})
-        else:
-            self.lastHeard[toCall].update({"nextMsgNo":msgNo+1})
+        if not fromCall:
+            fromCall = self.botCall
 
-        message=self.sanitize_aprs_msg(message)
+        msgNo = self.station(toCall).takeMsgNo()
+        self.saveStation(toCall)
 
         tries=3
-        counter=0
     
         #build a packet according to APRS spec
-        pkt=str(fromCall)+">APP614"+",TCPIP*::"+str(toCall.ljust(9, " "))+":"+str(message)+"{"+str(msgNo)
-        
-        for _ in range(tries):
-            if logging.getLogger().isEnabledFor(logging.DEBUG):
-                logging.info("Simulated send: "+pkt, extra={'className': self.__class__.__name__})
-            else:
-                sent=self.AIS.sendall(pkt)
-                logging.info("Sent: "+pkt, extra={'className': self.__class__.__name__})
-            result = await asyncio.wait_for(self._checkRx(toCall, msgNo),timeout=30)
-            if result:
-                logging.info("the message was acknowledged within the timeout period.")
-                return True
-        logging.info("Timeout reached; no ACK received for message "+str(msgNo))
+        pkt=FrameEncoder.message(fromCall, toCall, text, msgNo)
+
+        #register before the first transmission, so even a very fast ACK can't be missed
+        ack = self.pendingAcks.register(toCall, msgNo)
+        try:
+            for attempt in range(1, tries+1):
+                await self._transmit(pkt)
+                if attempt == 1:
+                    firstSent = time.monotonic()
+                try:
+                    #shield it, so a timeout on this try doesn't cancel the future for the next one
+                    if await asyncio.wait_for(asyncio.shield(ack), timeout=30):
+                        log.info("the message was acknowledged within the timeout period.", extra={"station": toCall, "msgNo": msgNo, "tries": attempt})
+                        Metrics.ackRoundTrip.observe(time.monotonic()-firstSent)
+                        Metrics.sendTries.observe(attempt, "acked")
+                        return True
+                    log.info("the message was rejected by %s", toCall, extra={"station": toCall, "msgNo": msgNo, "tries": attempt})
+                    Metrics.sendTries.observe(attempt, "rejected")
+                    return False
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.pendingAcks.discard(toCall, msgNo)
+        log.info("Timeout reached; no ACK received for message %s", msgNo, extra={"station": toCall, "msgNo": msgNo, "tries": tries})
+        Metrics.sendTries.observe(tries, "timeout")
         return False
     
-    async def send_aprs_ack(self, toCall: str, msgNo: int, fromCall: str = None):
+    def send_aprs_ack(self, toCall: str, msgNo: int, fromCall: str = None):
         if not fromCall:
             fromCall = self.botCall
 
         #build ACK packet per APRS spec
-        pkt=fromCall+">APP614"+",TCPIP*::"+toCall.ljust(9, " ")+":ack"+str(msgNo)
-    
-        #all ACKs should be sent twice. it's harder for mobile radios to receive an ACK than
-        #it is to transmit a message, so double-tapping the ACK is good practice. Even so,
-        #we may wind up receiving retransmitted messages that we've ACKed before. That's OK.
-        if logging.getLogger().isEnabledFor(logging.DEBUG):
-            logging.info("[DEBUG] Simulated ACK: "+pkt, extra={'className': self.__class__.__name__})
-            await asyncio.sleep(30)
-            logging.info("[DEBUG] Simulated ACK (double-tap): "+pkt, extra={'className': self.__class__.__name__})
-        else:
-            logging.info("Sending ACK: "+pkt, extra={'className': self.__class__.__name__})
-            sent=self.AIS.sendall(pkt)
-            await asyncio.sleep(30)
-            logging.info("Sending ACK (double-tap): "+pkt, extra={'className': self.__class__.__name__})
-            sent=self.AIS.sendall(pkt)
-        return None #there's nothing to return for an ACK
-
-    def aprs_callback(self, packet):
-        self.packetQueue.put(packet)
-        logging.info("put a packet on the queue, there are now "+str(self.packetQueue.qsize()), extra={'className': self.__class__.__name__})
-
-    def makeThreadedConsumer(self, loop):
-        return loop.run_in_executor(None, functools.partial(self.AIS.consumer, self.aprs_callback, immortal=True, raw=True, blocking=True))
+        pkt=FrameEncoder.ack(fromCall, toCall, msgNo)
+
+        #the scheduler sends it now, and again 30 seconds from now. Even so, we may wind up
+        #receiving retransmitted messages that we've ACKed before. That's OK.
+        self.acks.schedule(pkt, fromCall, toCall, msgNo)
+
+    async def aprs_callback(self, packet):
+        Metrics.packetsReceived.inc()
+        if b"\x00" in packet:
+            packet = packet.replace(b"\x00", b"{") #KD0TRD's radio sends nulls instead of curly braces
+        #most of what APRS-IS sends isn't for us; don't queue (or parse) it
+        if self.packetFilter.classify(packet) is None:
+            return
+        #the queue is bounded, so if the bridge falls behind this waits (and so does the socket read)
+        await self.packetQueue.put((time.monotonic(), packet))
+        log.debug("put a packet on the queue, there are now %d", self.packetQueue.qsize())
+
+    def makeConsumer(self):
+        return asyncio.create_task(self.AIS.consumer(self.aprs_callback, immortal=True))
 
         
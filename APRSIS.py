@@ -0,0 +1,251 @@
+#A minimal asyncio-native APRS-IS client.
+#aprslib.IS is a blocking socket client, so it had to live in its own thread and hand every
+#packet across a janus queue. This speaks the same protocol on the event loop instead:
+#login, filter, line framing, and writes that wait on the transport's buffer (backpressure).
+#
+#It also keeps the connection up by itself:
+#    host can be a comma-separated list of servers; their DNS answers are cached for a while,
+#    and every failed connection moves on to the next address, so a dead server is skipped. So
+#    does a session that goes silent, or that drops before it's been up for a keepalive period,
+#    so a half-dead server that takes our login and then does nothing is skipped too
+#    reconnects back off exponentially, with jitter, so a whole fleet doesn't reconnect in step
+#    servers send a "#" heartbeat line every 20 seconds or so; a quiet socket is a dead socket
+#    lines sent while we're reconnecting wait in an outbox, and go out once we're back; a line
+#    that's sent again while it's waiting (a message being retried) is only held once
+import asyncio
+import collections
+import random
+import socket
+import time
+
+import Metrics
+import Log
+
+log = Log.getLogger("aprs")
+
+class APRSISError(Exception):
+    pass
+
+class LoginError(APRSISError):
+    pass
+
+class KeepaliveError(APRSISError, ConnectionError):
+    #the server hasn't sent anything, not even a heartbeat, for too long
+    pass
+
+class APRSIS:
+    def __init__(self, callsign: str, passwd: str = "-1", host: str = "rotate.aprs.net", port: int = 14580, appName: str = "aprs-discord-bot", appVersion: str = "0.2",
+                 keepalive: float = 60, backoff: float = 1, maxBackoff: float = 120, dnsTTL: float = 300, outboxSize: int = 100, outboxMaxAge: float = 120):
+        self.callsign = callsign
+        self.passwd = passwd
+        self.servers = [server.strip() for server in host.split(",") if server.strip()]
+        self.port = port
+        self.appName = appName
+        self.appVersion = appVersion
+        self.filter = ""
+        self.reader: asyncio.StreamReader = None
+        self.writer: asyncio.StreamWriter = None
+        self.connected = False
+        self.verified = False
+        self.server = None #the address we're connected (or connecting) to
+
+        self.keepalive = keepalive #seconds without so much as a heartbeat before we give up on the socket
+        self.backoff = backoff
+        self.maxBackoff = maxBackoff
+        self.failures = 0
+        self.dnsTTL = dnsTTL
+        self.dns = {}       #server -> (expires, [addresses])
+        self.cursor = 0     #which address to try next
+        self.outbox = collections.OrderedDict() #line -> when, waiting for a connection
+        self.outboxSize = outboxSize
+        self.outboxMaxAge = outboxMaxAge
+        self.connectedAt = None
+        self.downSince = None #when we lost the connection; None while we're up (or haven't been up yet)
+
+    @property
+    def host(self) -> str:
+        return self.server[0] if self.server else self.servers[0]
+
+    def set_filter(self, filter: str):
+        self.filter = filter
+        #if we're already logged in, apply it right away with a server command
+        if self.connected:
+            asyncio.create_task(self.sendall("#filter "+filter))
+
+    async def _resolve(self, server: str) -> list:
+        expires, addresses = self.dns.get(server, (0, []))
+        if expires > time.monotonic():
+            return addresses
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(server, self.port, type=socket.SOCK_STREAM)
+        except OSError as exp:
+            log.warning("Couldn't look up %s (%s)%s", server, exp, "; using what we had" if addresses else "")
+            return addresses
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        random.shuffle(addresses) #spread out over a round-robin pool, like everyone else
+        self.dns[server] = (time.monotonic()+self.dnsTTL, addresses)
+        return addresses
+
+    async def _nextServer(self) -> tuple:
+        #(server, address), taking the servers in order and each of their addresses in turn
+        candidates = [(server, address) for server in self.servers for address in await self._resolve(server)]
+        if not candidates:
+            raise APRSISError("None of "+", ".join(self.servers)+" could be looked up")
+        return candidates[self.cursor % len(candidates)]
+
+    async def connect(self, timeout: float = 15):
+        self.server = await self._nextServer()
+        log.info("APRS-IS connecting to %s (%s):%s", self.server[0], self.server[1], self.port)
+        try:
+            self.reader, self.writer = await asyncio.wait_for(asyncio.open_connection(self.server[1], self.port), timeout=timeout)
+        except BaseException:
+            self.cursor += 1 #next time, try somewhere else
+            raise
+        try:
+            #servers greet us with a banner line, something like "# aprsc 2.1.14"
+            banner = await asyncio.wait_for(self.reader.readline(), timeout=timeout)
+            if not banner.startswith(b"#"):
+                raise APRSISError("Unexpected banner from APRS-IS: "+repr(banner))
+            await self._login(timeout)
+        except BaseException:
+            self.writer.close()
+            self.cursor += 1
+            raise
+        self.connected = True
+        self.connectedAt = time.monotonic()
+        if self.downSince is not None:
+            Metrics.aprsisDowntime.inc(amount=self.connectedAt-self.downSince)
+            self.downSince = None
+        Metrics.aprsisConnections.inc(self.server[0])
+        await self._flush()
+
+    async def _login(self, timeout: float):
+        login = "user "+self.callsign+" pass "+str(self.passwd)+" vers "+self.appName+" "+self.appVersion
+        if self.filter:
+            login += " filter "+self.filter
+        await self._write(login)
+
+        #the answer is "# logresp CALL verified, server XXXX" (or unverified)
+        while True:
+            line = await asyncio.wait_for(self.reader.readline(), timeout=timeout)
+            if not line:
+                raise LoginError("APRS-IS closed the connection during login")
+            if line.startswith(b"# logresp"):
+                break
+        fields = line.decode("ascii", "ignore").split()
+        if len(fields) < 4 or fields[2] != self.callsign:
+            raise LoginError("APRS-IS rejected login: "+line.decode("ascii", "ignore").strip())
+        self.verified = fields[3].startswith("verified")
+        if not self.verified:
+            log.warning("APRS-IS login is unverified; the server won't forward anything we transmit.")
+        log.info("APRS-IS logged in: %s", line.decode("ascii", "ignore").strip())
+
+    async def _write(self, line):
+        if isinstance(line, str):
+            line = line.encode("utf-8")
+        self.writer.write(line.rstrip(b"\r\n")+b"\r\n")
+        #drain() only blocks while the transport's write buffer is over its high-water mark
+        await self.writer.drain()
+
+    async def _flush(self):
+        cutoff = time.monotonic()-self.outboxMaxAge
+        if self.outbox:
+            log.info("APRS-IS sending %d lines held while we were reconnecting", len(self.outbox))
+        while self.outbox and self.connected:
+            line, queued = self.outbox.popitem(last=False)
+            if queued < cutoff:
+                Metrics.aprsisOutboxDropped.inc()
+                continue
+            await self._write(line)
+            log.debug("Sent (held): %s", line)
+
+    def _hold(self, line):
+        if line in self.outbox:
+            #already waiting; it keeps its place, and its age starts over
+            self.outbox[line] = time.monotonic()
+            return
+        if len(self.outbox) >= self.outboxSize:
+            Metrics.aprsisOutboxDropped.inc() #the oldest one falls off
+            self.outbox.popitem(last=False)
+        self.outbox[line] = time.monotonic()
+
+    async def sendall(self, line: str) -> bool:
+        #while we're disconnected, lines wait in the outbox instead of failing.
+        #True if the line went out now, False if it's being held.
+        if not self.connected:
+            log.debug("APRS-IS is down; holding %s", line)
+            self._hold(line)
+            return False
+        try:
+            await self._write(line)
+        except (ConnectionError, OSError) as exp:
+            log.warning("APRS-IS write failed (%s); holding it until we reconnect", exp)
+            self._lost()
+            self._hold(line)
+            return False
+        return True
+
+    def _lost(self):
+        if self.connected:
+            self.downSince = time.monotonic()
+        self.connected = False
+        if self.writer:
+            self.writer.close()
+
+    async def readline(self) -> bytes:
+        #returns the next packet line, without its line ending.
+        #server comments (they start with #) are skipped here, like aprslib does, but they
+        #still count as signs of life.
+        while True:
+            try:
+                line = await asyncio.wait_for(self.reader.readline(), timeout=self.keepalive)
+            except asyncio.TimeoutError:
+                self._lost()
+                raise KeepaliveError("APRS-IS has been silent for "+str(self.keepalive)+"s")
+            if not line:
+                self._lost()
+                raise ConnectionError("APRS-IS closed the connection")
+            line = line.rstrip(b"\r\n")
+            if line and not line.startswith(b"#"):
+                return line
+
+    def _backoffDelay(self) -> float:
+        #equal jitter on an exponential backoff: anywhere from half to all of it
+        delay = min(self.maxBackoff, self.backoff*2**(self.failures-1))
+        return random.uniform(delay/2, delay)
+
+    async def consumer(self, callback, immortal: bool = True):
+        #feed every packet line to callback (a coroutine function) until cancelled
+        while True:
+            try:
+                if not self.connected:
+                    await self.connect()
+                while True:
+                    await callback(await self.readline())
+            except (ConnectionError, OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, APRSISError) as exp:
+                if self.connectedAt is not None:
+                    if time.monotonic()-self.connectedAt > self.keepalive and not isinstance(exp, KeepaliveError):
+                        #a connection that stayed up for a while earns a fresh start on the backoff,
+                        #and another go at the same server
+                        self.failures = 0
+                    else:
+                        #it took our login, then went quiet or kept dropping us: try somewhere else
+                        self.cursor += 1
+                self.connectedAt = None
+                self._lost()
+                if not immortal:
+                    raise
+                self.failures += 1
+                delay = self._backoffDelay()
+                Metrics.aprsisReconnects.inc()
+                log.warning("APRS-IS connection lost (%s). Reconnecting in %.1fs", exp, delay)
+                await asyncio.sleep(delay)
+
+    async def close(self):
+        self.connected = False
+        if self.writer:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
@@ -0,0 +1,40 @@
+#Tracks ACKs we're waiting on for messages we've sent.
+#Each outbound message registers a future under (callsign, msgNo). When the ACK packet
+#arrives, the bridge resolves that future and whoever is awaiting it wakes up immediately.
+#Nothing polls, so a message waiting on an ACK costs nothing until the ACK shows up.
+import asyncio
+
+class AckRegistry:
+    def __init__(self):
+        self.pending = {}
+
+    @staticmethod
+    def _key(callsign, msgNo):
+        #ACKs come off the wire as strings, but we number our messages with ints
+        return (str(callsign).upper(), str(msgNo))
+
+    def register(self, callsign, msgNo) -> asyncio.Future:
+        key = self._key(callsign, msgNo)
+        if key not in self.pending or self.pending[key].done():
+            self.pending[key] = asyncio.get_running_loop().create_future()
+        return self.pending[key]
+
+    def resolve(self, callsign, msgNo, acked: bool = True) -> bool:
+        #returns True if someone was waiting on this ACK (or REJ, with acked=False).
+        #late or duplicate ACKs (radios love to repeat them) are ignored.
+        future = self.pending.pop(self._key(callsign, msgNo), None)
+        if future is None or future.done():
+            return False
+        future.set_result(acked)
+        return True
+
+    def discard(self, callsign, msgNo):
+        future = self.pending.pop(self._key(callsign, msgNo), None)
+        if future is not None and not future.done():
+            future.cancel()
+
+    def __len__(self):
+        return len(self.pending)
+
+    def __contains__(self, key):
+        return self._key(*key) in self.pending
@@ -0,0 +1,103 @@
+#Sends our ACKs, each one twice: once right away and again repeatDelay seconds later.
+#It's harder for a mobile radio to hear an ACK than to transmit a message, so double-tapping is
+#good practice. This used to be a task per ACK that sent, slept and sent again; a station that
+#kept retransmitting piled up sleeping tasks and bursts of duplicate ACKs.
+#Now every pending ACK is an entry on one heap, worked by one timer task. An ACK that's already
+#pending for the same (fromCall, toCall, msgNo) is merged into the existing entry, and ACKs are
+#paced by their own token bucket, so a retry storm can't crowd out everything else we transmit.
+import asyncio
+import heapq
+import itertools
+import time
+
+from TokenBucket import TokenBucket
+import Log
+
+log = Log.getLogger("aprs")
+
+class _Pending:
+    __slots__ = ("pkt", "due", "left")
+
+    def __init__(self, pkt, due, left):
+        self.pkt = pkt
+        self.due = due
+        self.left = left #transmissions still to go
+
+class AckScheduler:
+    def __init__(self, transmit, repeatDelay: float = 30, taps: int = 2, rate: float = 1, burst: float = 3):
+        self.transmit = transmit #coroutine function, called as transmit(pkt, label)
+        self.repeatDelay = repeatDelay
+        self.taps = taps
+        self.budget = TokenBucket(rate, burst)
+        self.pending = {}   #(fromCall, toCall, msgNo) -> _Pending
+        self.heap = []      #(due, tiebreak, key); entries whose due has moved are skipped when popped
+        self.order = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.worker = None
+
+    def schedule(self, pkt: str, fromCall: str, toCall: str, msgNo):
+        key = (fromCall, toCall.upper(), str(msgNo))
+        now = time.monotonic()
+        entry = self.pending.get(key)
+        if entry is None:
+            entry = self.pending[key] = _Pending(pkt, now, self.taps)
+        elif entry.due > now:
+            #the station retransmitted, so it didn't hear us: ACK now, and double-tap again later
+            entry.due = now
+            entry.left = self.taps
+        else:
+            #the first tap hasn't gone out yet; this one rides along with it
+            log.debug("ACK for %s already pending", key, extra={"station": toCall, "msgNo": msgNo})
+            return
+        heapq.heappush(self.heap, (entry.due, next(self.order), key))
+        self.wakeup.set()
+        if self.worker is None:
+            self.worker = asyncio.create_task(self._run())
+
+    def __len__(self):
+        return len(self.pending)
+
+    async def _sleep(self, delay):
+        #a timer that sets the event, rather than wait_for(): on Python < 3.12, wait_for() loses a
+        #cancel that lands just as the event is set, and then close() waits forever
+        timer = asyncio.get_running_loop().call_later(delay, self.wakeup.set) if delay is not None else None
+        try:
+            await self.wakeup.wait()
+        finally:
+            if timer:
+                timer.cancel()
+        self.wakeup.clear()
+
+    async def _run(self):
+        while True:
+            if not self.heap:
+                await self._sleep(None)
+                continue
+            due, _, key = self.heap[0]
+            delay = due-time.monotonic()
+            if delay > 0:
+                await self._sleep(delay) #or until something earlier is scheduled
+                continue
+            heapq.heappop(self.heap)
+            entry = self.pending.get(key)
+            if entry is None or entry.due != due:
+                continue #stale: it was merged and rescheduled
+
+            await self.budget.take()
+            label = "ACK" if entry.left == self.taps else "ACK (double-tap)"
+            entry.left -= 1
+            if entry.left:
+                entry.due = time.monotonic()+self.repeatDelay
+                heapq.heappush(self.heap, (entry.due, next(self.order), key))
+            else:
+                del self.pending[key]
+            try:
+                await self.transmit(entry.pkt, label)
+            except (ConnectionError, OSError) as exp:
+                log.warning("Couldn't send %s: %s", label, exp, extra={"station": key[1], "msgNo": key[2]})
+
+    async def close(self):
+        if self.worker:
+            self.worker.cancel()
+            await asyncio.gather(self.worker, return_exceptions=True)
+            self.worker = None
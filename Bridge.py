@@ -0,0 +1,324 @@
+#The bridge engine, shared by every way of running the bot: APRS-IS in, through the packet filter,
+#parser and dedup, out to a sink (see Sink.py), and ACKed once the sink has it. Which sink is picked
+#at startup; the gateway sink's imports (discord.py) are only loaded if it's the one picked.
+import os
+import time
+from datetime import datetime
+import argparse
+import asyncio
+import aprslib
+
+from APRSClient import APRSClient
+from APRSIS import APRSIS
+import Transport
+from SendScheduler import SendScheduler
+from StateStore import SqliteStateStore
+from StationRegistry import StationRegistry
+from Router import Router
+from Pipeline import Pipeline
+from Sink import SinkError
+import Dedup
+import Metrics
+import Log
+
+log = Log.getLogger("bridge")
+
+SINKS = ("gateway", "webhook")
+SHUTDOWN_SECONDS = 5 #from Ctrl-C to exit, however much is left to do
+
+def embedFor(packet: dict) -> dict:
+    #a discord message for an APRS message
+    embed = {
+        "title": packet['from']+": ",
+        "type": "rich",
+        "description": packet['message_text'],
+        "url": "https://aprs.fi/?c=raw&call="+packet['from'],
+        "timestamp": str(datetime.now()),
+        "fields": [
+            {"name": "via", "value": packet['via'], "inline": True},
+        ],
+    }
+    if 'msgNo' in packet:
+        embed["fields"].append({"name": "msgNo", "value": packet['msgNo'], "inline": True})
+    return embed
+
+class Bridge:
+    def __init__(self, aprs: APRSClient, router: Router, sink, sendScheduler: SendScheduler = None, shards: int = 16, parseWorkers: int = 0, dedup: Dedup.Dedup = None):
+        self.aprs = aprs
+        self.router = router
+        self.sink = sink
+        self.sendScheduler = sendScheduler
+        self.dedup = dedup or Dedup.Dedup()
+        self.delivering = set() #(station, Dedup.key) accepted, but not posted yet
+        self.pipeline = Pipeline(aprs.packetQueue, self.route, self.accept, self.deliver, shards=shards, parseWorkers=parseWorkers)
+
+    def route(self, packet: dict) -> str:
+        #warning: always check whether something is in the packet before trying to read it
+        #or else you'll get a dict KeyError
+        Dedup.normalize(packet)
+        if 'format' in packet and packet['format'] == "message":
+            if 'replyAck' in packet:
+                #an ACK for one of ours, riding along on this packet
+                log.info("Got a reply-ACK for message %s", packet['replyAck'], extra={"station": packet['from'], "msgNo": packet['replyAck']})
+                self.aprs.handle_ack(packet['from'], packet['replyAck'])
+
+            if 'response' in packet and packet['response'] == "ack":
+                log.info("Got an ACK for message %s", packet['msgNo'], extra={"station": packet['from'], "msgNo": packet['msgNo']})
+                if not self.aprs.handle_ack(packet['from'], packet['msgNo']):
+                    log.info("(nobody was waiting on that one - probably a repeated ACK)")
+
+            elif 'response' in packet and packet['response'] == "rej":
+                log.info("Got a REJ for message %s", packet['msgNo'], extra={"station": packet['from'], "msgNo": packet['msgNo']})
+                self.aprs.handle_rej(packet['from'], packet['msgNo'])
+
+            elif 'message_text' in packet:
+                #which of our callsigns was it sent to? that decides the channel.
+                if not self.router.forCall(packet.get('addresse')):
+                    log.info("Got a message for %s, which isn't one of mine.", packet.get('addresse'))
+                    return None
+                return packet['from'] #a station's messages stay in order
+        return None
+
+    def accept(self, packet: dict) -> bool:
+        route = self.router.forCall(packet.get('addresse'))
+        msgNo = packet.get('msgNo')
+        log.info("Got a message! Here it is: %s: %s... msgno %s", packet['from'], packet['message_text'], msgNo, extra={"station": packet['from'], "msgNo": msgNo})
+        key = Dedup.key(packet)
+
+        if (packet['from'], key) in self.delivering:
+            #a retransmission of one that's on its way to Discord; it gets ACKed when it's posted
+            log.info('Already posting this one', extra={"station": packet['from'], "msgNo": msgNo})
+            Metrics.duplicates.inc()
+            return False
+
+        if not self.dedup.seen(self.aprs.station(packet['from']), key):
+            self.delivering.add((packet['from'], key))
+            return True
+
+        Metrics.duplicates.inc()
+        if msgNo is None:
+            log.info('Heard this one before - not posting', extra={"station": packet['from']})
+            return False
+        log.info('Heard this one before - not posting, repeating ACK', extra={"station": packet['from'], "msgNo": msgNo})
+        self.aprs.send_aprs_ack(toCall=packet['from'],msgNo=msgNo,fromCall=route.botCall)
+        return False
+
+    async def deliver(self, packet: dict):
+        route = self.router.forCall(packet.get('addresse'))
+        msgNo = packet.get('msgNo')
+        key = Dedup.key(packet)
+        try:
+            log.info("This one's worth posting to Discord. Let's do it.")
+            posted = await self.sink.deliver(route, packet['from'], embedFor(packet))
+        except SinkError as exp:
+            #no post, so no ACK: the station will retry, and we'll try again then
+            log.warning("Couldn't post that message: %s", exp, extra={"station": packet['from'], "msgNo": msgNo})
+            self.delivering.discard((packet['from'], key))
+            return
+        except BaseException:
+            self.delivering.discard((packet['from'], key))
+            raise
+        if posted is None:
+            self._posted(packet, route, key)
+        else:
+            #the sink posts it later; the shard moves on to the next message meanwhile
+            posted.add_done_callback(lambda posted: self._posted(packet, route, key, posted))
+
+    def _posted(self, packet: dict, route, key: int, posted: asyncio.Future = None):
+        msgNo = packet.get('msgNo')
+        try:
+            if posted is not None and (posted.cancelled() or posted.exception() is not None):
+                #no post, so no ACK: the station will retry, and we'll try again then
+                log.warning("Couldn't post that message: %s", "gave up on it" if posted.cancelled() else posted.exception(), extra={"station": packet['from'], "msgNo": msgNo})
+                return
+            if msgNo is not None:
+                #acknowledge delivery via APRS (messages without a msgNo don't want one)
+                self.aprs.send_aprs_ack(toCall=packet['from'],msgNo=msgNo,fromCall=route.botCall)
+            self.dedup.remember(self.aprs.station(packet['from']), key)
+            self.aprs.saveStation(packet['from'])
+        finally:
+            self.delivering.discard((packet['from'], key))
+
+    async def run(self):
+        await self.pipeline.run()
+
+def makeSink(name: str):
+    #imported here, so a webhook-only bot never loads discord.py
+    if name == "gateway":
+        from GatewaySink import GatewaySink
+        return GatewaySink
+    from WebhookSink import WebhookSink
+    return WebhookSink
+
+async def main(sink: str = "gateway"):
+
+    parser = argparse.ArgumentParser(description='Bridge between APRS and Discord.')
+    parser.add_argument( '-log',
+        '--loglevel',
+        default='warning',
+        help='Use INFO to get lots of logging, DEBUG for even more')
+
+    parser.add_argument( '--sink', default=sink, choices=SINKS, help='gateway logs in as a Discord bot, with a thread per station and replies relayed back over APRS. webhook only posts to a webhook URL, and never loads discord.py.')
+    parser.add_argument( '--transport', default=os.environ.get('APRS_BOT_TRANSPORT', 'live'), choices=Transport.MODES, help='live transmits on APRS-IS. dryrun transmits nothing. loopback transmits nothing, and ACKs every message itself.')
+    parser.add_argument( '--logFormat', default='text', choices=['text','json'], help='Log as plain text, or as one JSON object per line')
+    parser.add_argument( '-bot','--botNick','--botName', dest='botNick', default="aprsbot", help='Username for the bot to use in Discord')
+    parser.add_argument( '--botSecret', default=None, help='Discord bot secret (gateway), or webhook URL (webhook). Defaults to DISCORD_BOT_SECRET or DISCORD_WEBHOOK_URL, to match.')
+    parser.add_argument( '--botCall', default=os.environ.get('DISCORD_BOT_CALL'), help='Callsign for the bot to use on APRS')
+    parser.add_argument( '--botSSID', default=os.environ.get('DISCORD_BOT_SSID'), help='SSID for the bot to use on APRS, appended to --botCall. Include the leading dash.')
+    parser.add_argument( '--requiredRoles', default=os.environ.get('DISCORD_REQUIRED_ROLES', "PPRAA Members,General Hams"), help='Comma-separated Discord roles a member needs (all of them) to transmit via APRS.')
+    parser.add_argument( '--botChannelID', type=int, default=os.environ.get('DISCORD_BOT_CHANNEL'), help='Discord channel ID to bridge.')
+    parser.add_argument( '--route', action='append', default=[r for r in os.environ.get('DISCORD_BOT_ROUTES', '').split(',') if r], help='Bridge another callsign to another channel, as CALL-SSID=channelID. Repeat for more. If unset, --botCall goes to --botChannelID.')
+    parser.add_argument( '--adminCall', default=os.environ.get('APRS_CALL'), help='Callsign to authenticate with APRS. Under whose license are you transmitting?')
+    parser.add_argument( '--adminSSID', default=os.environ.get('APRS_SSID'), help='SSID for the admin, who will receive APRS status updates. If unset, none are sent.')
+    parser.add_argument( '--adminPass', default=os.environ.get('APRS_PASSWD'), help='Password for the APRS user.')
+    parser.add_argument( '--aprsHost', default="noam.aprs2.net,rotate.aprs2.net", help='APRS-IS servers, comma-separated. Later ones are fallbacks.')
+    parser.add_argument( '--aprsPort', type=int, default=14580, help='APRS-IS port')
+    parser.add_argument( '--maxConcurrentSends', type=int, default=4, help='How many stations we may be waiting on ACKs from at once.')
+    parser.add_argument( '--txRate', type=float, default=2, help='Average APRS packets per second we may transmit.')
+    parser.add_argument( '--txBurst', type=float, default=5, help='How many APRS packets we may transmit back-to-back before txRate applies.')
+    parser.add_argument( '--partWindow', type=int, default=2, help='A reply too long for one APRS message goes in numbered parts; this many may wait on ACKs at once.')
+    parser.add_argument( '--ackRate', type=float, default=1, help='Average ACKs per second we may transmit (out of txRate).')
+    parser.add_argument( '--shards', type=int, default=16, help='How many groups of stations the bridge works on in parallel. Each station\'s messages stay in order.')
+    parser.add_argument( '--parseWorkers', type=int, default=0, help='Parse packets in this many worker processes. If unset, they are parsed on the event loop.')
+    parser.add_argument( '--dedupWindow', type=int, default=32, help='How many recent messages to remember per station, to spot retransmissions.')
+    parser.add_argument( '--dedupTTL', type=float, default=1800, help='Seconds a message is remembered for. A retransmission after that is posted again.')
+    parser.add_argument( '--batchWindow', type=float, default=0.5, help='Seconds to collect messages for a Discord thread before posting them together.')
+    parser.add_argument( '--stateFile', default=os.environ.get('APRS_BOT_STATE'), help='SQLite file for remembering stations and threads across restarts. If unset, nothing is saved.')
+    parser.add_argument( '--maxStations', type=int, default=1000, help='How many stations (and their Discord threads) to keep track of.')
+    parser.add_argument( '--metricsPort', type=int, default=os.environ.get('APRS_BOT_METRICS_PORT'), help='Serve Prometheus metrics on this local port. If unset, metrics are not served.')
+    parser.add_argument( '--aprsMsgNo', type=int, default=int(time.time()/10%(pow(10,2))), help='The first message number to use with a station we have no record of. If unset, it comes from the clock, so a restart without --stateFile is unlikely to start where the last run did.')
+    args = parser.parse_args()
+
+    Log.setup(args.loglevel, asJSON=(args.logFormat == "json"))
+    if args.botSecret is None:
+        args.botSecret = os.environ.get('DISCORD_WEBHOOK_URL' if args.sink == "webhook" else 'DISCORD_BOT_SECRET')
+    if args.botSSID and args.botCall:
+        args.botCall = args.botCall+args.botSSID
+
+    if args.route:
+        myRouter = Router.parse(args.route)
+    else:
+        myRouter = Router.parse([str(args.botCall)+"="+str(args.botChannelID)])
+    botCall = myRouter.calls()[0] #the default sender, for anything that isn't a reply on a route
+
+    if not args.adminPass:
+        args.adminPass = aprslib.passcode(args.adminCall)
+        log.warning("You should provide a passcode. I'm guessing it should be %s", args.adminPass)
+
+    #configure state
+    #without a state file, the registry is all the state there is
+    myState = SqliteStateStore(args.stateFile) if args.stateFile else None
+    if myState:
+        await myState.start()
+    myStations = StationRegistry(state=myState, size=args.maxStations, firstMsgNo=args.aprsMsgNo) #both sides of the bridge share it
+
+    #configure APRS
+    myPacketQueue = asyncio.Queue(maxsize=1000) #aprs packets received, waiting for the bridge
+    myAPRSClient = APRSClient(myPacketQueue, botCall, txRate=args.txRate, txBurst=args.txBurst, stations=myStations, addressees=myRouter.calls(), ackRate=args.ackRate, partWindow=args.partWindow)
+    mySendScheduler = SendScheduler(myAPRSClient, maxConcurrent=args.maxConcurrentSends)
+    myAPRSClient.AIS = APRSIS(args.adminCall,args.adminPass,host=args.aprsHost,port=args.aprsPort)
+    myAPRSClient.transport = Transport.make(args.transport, AIS=myAPRSClient.AIS, receive=myAPRSClient.aprs_callback) #we still listen to APRS-IS either way
+    if args.transport != "live":
+        log.warning("Transport is %s: nothing will be transmitted on APRS-IS.", args.transport)
+    myAPRSClient.AIS.set_filter(myRouter.aprsFilter()) #one connection, one filter, for every route
+
+    #configure metrics
+    Metrics.Gauge("aprs_queue_depth", "Packets waiting in the packet queue", collect=myPacketQueue.qsize)
+    Metrics.Gauge("aprs_send_queue_depth", "Outbound messages waiting in the send scheduler", collect=lambda: sum(mySendScheduler.queueDepths().values()))
+    Metrics.Gauge("aprs_pending_acks", "Outbound messages waiting on an ACK", collect=lambda: len(myAPRSClient.pendingAcks))
+    Metrics.Gauge("aprs_scheduled_acks", "ACKs of ours still to be sent or double-tapped", collect=lambda: len(myAPRSClient.acks))
+    Metrics.Gauge("aprs_is_connected", "1 while we're logged in to APRS-IS", collect=lambda: int(myAPRSClient.AIS.connected))
+    Metrics.Gauge("aprs_is_down_seconds", "How long the current APRS-IS outage has lasted", collect=lambda: time.monotonic()-myAPRSClient.AIS.downSince if myAPRSClient.AIS.downSince is not None else 0)
+    Metrics.Gauge("aprs_is_outbox_depth", "Lines waiting to be sent once APRS-IS is back", collect=lambda: len(myAPRSClient.AIS.outbox))
+    Metrics.Gauge("stations_tracked", "Stations held in memory", collect=lambda: len(myStations))
+    Metrics.Counter("aprs_prefilter_total", "Raw lines by pre-filter verdict", ["kind"], collect=lambda: myAPRSClient.packetFilter.counts)
+    if args.metricsPort:
+        await Metrics.serve(int(args.metricsPort))
+
+    #configure Discord
+    mySink = makeSink(args.sink).fromArgs(args, myRouter, myStations)
+    myBridge = Bridge(myAPRSClient, myRouter, mySink, sendScheduler=mySendScheduler, shards=args.shards, parseWorkers=args.parseWorkers, dedup=Dedup.Dedup(args.dedupWindow, args.dedupTTL))
+    Metrics.Gauge("bridge_stage_queue_depth", "Packets waiting for each stage of the bridge", ["stage"], collect=myBridge.pipeline.queueDepths)
+    if args.sink == "gateway":
+        Metrics.Gauge("discord_post_queue_depth", "Messages waiting to be posted to Discord threads", collect=lambda: sum(mySink.client.posts.queueDepths().values()))
+    adminCall = args.adminCall+args.adminSSID if args.adminSSID else None
+
+    myBridgeTask = None
+    try:
+
+        #start discord
+        await mySink.start(myBridge)
+        await mySink.announce("Bot online! Send an APRS message to "+", ".join(myRouter.calls())+" to have it posted here.")
+
+        #start APRS
+        #AIS.consumer() runs right here on the event loop, connecting (and reconnecting) as it
+        #needs to, and feeding raw lines into the queue
+        myBridgeTask = asyncio.create_task(myBridge.run())
+        if adminCall:
+            mySendScheduler.submit(toCall=adminCall, message="script online", fromCall=botCall)
+        await myAPRSClient.makeConsumer()
+
+        #execution should never reach this point
+        raise asyncio.CancelledError
+
+    except asyncio.CancelledError:
+        log.warning("Shutdown requested...")
+
+    finally:
+        #all of this has to fit in the SHUTDOWN_SECONDS run() gives us
+        if myBridgeTask:
+            myBridgeTask.cancel()
+            await asyncio.gather(myBridgeTask, return_exceptions=True)
+        try:
+            if adminCall:
+                log.info('notifying admin')
+                await _shutdownStep("notify the admin", myAPRSClient.send_aprs_notice(toCall=adminCall, message="script offline", fromCall=botCall), 1)
+            await _shutdownStep("announce we're offline", mySink.announce("Bot is now offline."), 0.5)
+
+            #shutdown discord
+            await _shutdownStep("close the sink", mySink.close(timeout=1.5), 2)
+
+            #shutdown aprs
+            await mySendScheduler.close()
+            await myAPRSClient.acks.close()
+            log.info('closing aprs')
+            await _shutdownStep("close APRS-IS", myAPRSClient.AIS.close(), 0.5)
+            log.info('aprs is closed')
+        finally:
+            if myState:
+                await myState.close()
+
+
+async def _shutdownStep(what: str, aw, timeout: float):
+    #one step of shutting down: it gets timeout seconds, and if it fails, the next step still runs
+    try:
+        await asyncio.wait_for(aw, timeout=timeout)
+    except asyncio.TimeoutError:
+        log.warning("Gave up trying to %s after %ss", what, timeout)
+    except Exception:
+        log.exception("Couldn't %s", what)
+
+def run(sink: str = "gateway"):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.set_debug(True)
+    mainTask = None
+    try:
+        mainTask = loop.create_task(main(sink))
+        loop.run_until_complete(mainTask)
+        #this should never finish
+        raise KeyboardInterrupt
+    except KeyboardInterrupt:
+        log.info("Shutting down gracefully")
+        if mainTask:
+            mainTask.cancel()
+        try:
+            loop.run_until_complete(asyncio.wait_for(mainTask, timeout=SHUTDOWN_SECONDS))
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            log.warning("Shutdown took longer than %ss; not waiting any more", SHUTDOWN_SECONDS)
+        log.info('done cancelling')
+        Log.shutdown() #os._exit() skips atexit, which is where the last records would be written
+        os._exit(0) #let OS kill remaining threads
+
+if __name__ == "__main__":
+    run()
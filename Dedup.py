@@ -0,0 +1,97 @@
+#Decides whether an inbound message is one we've already posted.
+#Stations retransmit a message until they hear our ACK, so we see most messages more than once.
+#We used to keep the highest msgNo per station and drop anything at or below it, which broke when a
+#station's counter wrapped or reset (a power cycle), and on alphanumeric message IDs (int() raised).
+#Instead, each station keeps a short window of the messages it sent recently, as a CRC of the msgNo
+#and the text together, and a message is a duplicate only if the same one was seen within ttl
+#seconds. A reset counter sends different text under an old number, so it gets through; a
+#retransmission doesn't.
+#The window lives on the station's record (StationRegistry), so it's saved with it and is bounded
+#by window entries per station, and by the registry's size overall. It's packed into one array of
+#32-bit ints, (key, when, key, when, ...) oldest first, since there can be a lot of stations: a full
+#window of 32 is 256 bytes. A check looks through at most that many, newest first.
+#
+#APRS 1.1 reply-acks put an ACK for one of our messages on the end of the message ID, as
+#text{MM}AA (or ackMM}AA on an ACK), where MM is the message's ID and AA is ours. aprslib 0.7 hands
+#AA back as ackMsgNo; older versions leave it in msgNo or the text. normalize() puts it in replyAck
+#either way, before anything else looks at the packet.
+import array
+import re
+import time
+import zlib
+
+#text{MM}AA, or text{MM} from a station that's saying it understands reply-acks
+_REPLY_ACK = re.compile(r"\{([A-Za-z0-9]{1,5})\}([A-Za-z0-9]{0,5})$")
+#ackMM}AA (or rej), which older aprslib takes for a message with the text "ackMM}AA"
+_REPLY_ACK_RESPONSE = re.compile(r"^(ack|rej)([A-Za-z0-9]{1,5})\}([A-Za-z0-9]{0,5})$")
+
+def normalize(packet: dict) -> dict:
+    #in place: msgNo is just the message's ID, and an ACK riding along with it is in replyAck
+    if packet.get('format') != "message":
+        return packet
+    if packet.get('ackMsgNo'):
+        packet['replyAck'] = packet['ackMsgNo']
+    if 'response' in packet:
+        return packet
+    text = packet.get('message_text')
+    if text is None:
+        return packet
+    response = _REPLY_ACK_RESPONSE.match(text)
+    if response:
+        del packet['message_text']
+        packet['response'], packet['msgNo'] = response.group(1), response.group(2)
+        if response.group(3):
+            packet['replyAck'] = response.group(3)
+        return packet
+    if 'msgNo' in packet:
+        msgNo, brace, replyAck = str(packet['msgNo']).partition("}")
+        if brace:
+            packet['msgNo'] = msgNo
+            if replyAck:
+                packet['replyAck'] = replyAck
+        return packet
+    match = _REPLY_ACK.search(text)
+    if match:
+        packet['message_text'] = text[:match.start()]
+        packet['msgNo'] = match.group(1)
+        if match.group(2):
+            packet['replyAck'] = match.group(2)
+    return packet
+
+def key(packet: dict) -> int:
+    #what makes a message the same message: its ID (if it has one) and its text.
+    #msgNos are alphanumeric, so the } keeps ("1", "2x") apart from ("12", "x")
+    return zlib.crc32(((packet.get('msgNo') or "")+"}"+packet['message_text']).encode("utf-8", "ignore"))
+
+class Dedup:
+    def __init__(self, window: int = 32, ttl: float = 1800):
+        self.window = window #messages remembered per station
+        self.ttl = ttl       #seconds a message is remembered for
+
+    @staticmethod
+    def _find(seen, key: int) -> int:
+        #where key is in the window, or -1
+        for index in range(len(seen)-2, -1, -2):
+            if seen[index] == key:
+                return index
+        return -1
+
+    def seen(self, station, key: int) -> bool:
+        seen = station.seen
+        index = self._find(seen, key) if seen else -1
+        return index >= 0 and time.time()-seen[index+1] < self.ttl
+
+    def remember(self, station, key: int):
+        now = int(time.time())
+        if station.seen is None:
+            station.seen = array.array("I")
+        seen = station.seen
+        index = self._find(seen, key)
+        if index >= 0:
+            del seen[index:index+2] #so it moves to the newest end
+        seen.extend((key, now))
+        #oldest first, so stop at the first one that's still fresh (or once we're back in the window)
+        drop = 0
+        while drop < len(seen) and (len(seen)-drop > 2*self.window or now-seen[drop+1] >= self.ttl):
+            drop += 2
+        del seen[:drop]
@@ -1,30 +1,63 @@
 import discord
-import logging
 import asyncio
-from RingDict import RingDict
+from RoleAuthorizer import RoleAuthorizer
+from PostBatcher import PostBatcher
+from ThreadResolver import ThreadResolver
+from StationRegistry import StationRegistry
+import Log
+
+log = Log.getLogger("discord")
 
 class DiscordClient(discord.Client):
-    targetChannel : discord.channel = None
+    router = None #which channel goes with which bot callsign
     botNick = None
+    connection = None #the connect() task; the loop only keeps a weak reference to it
     
-    lastHeard = RingDict(size=10)
-    #    "AD8IS-10": {
-    #        "thread":1234567890,   #the discord thread id used to converse with this client
-    #        }
-    #    }
-
-    def __init__(self, botNick, *args, **kwargs):
+    def __init__(self, botNick, *args, maxStations: int = 1000, requiredRoles=(), stations=None, batchWindow: float = 0.5, **kwargs):
         super().__init__(*args, **kwargs)
         self.botNick = botNick
+        self.stations = stations if stations is not None else StationRegistry(size=maxStations) #shared with APRSClient
+        self.authorizer = RoleAuthorizer(requiredRoles)
+        self.threads = ThreadResolver(self) #finds (or makes) a station's thread
+        self.posts = PostBatcher(window=batchWindow, maxThreads=maxStations) #what we post in threads, a burst at a time
+
+    #a station gets one thread per route (bot callsign) it talks to
+    def rememberThread(self, botCall: str, callsign: str, threadId: int):
+        self.stations.rememberThread(botCall, callsign, threadId)
+
+    def threadFor(self, botCall: str, callsign: str) -> int:
+        return self.stations.threadFor(botCall, callsign)
+
+    def callsignForThread(self, threadId: int) -> str:
+        return self.stations.callsignForThread(threadId)
 
     async def boot(self,botSecret):
-        logging.info("Discord logging in...", extra={'className': self.__class__.__name__})
+        log.info("Discord logging in...")
         await self.login(token=botSecret)
-        logging.info("Discord logged in. Connecting...", extra={'className': self.__class__.__name__})
-        discord_task = asyncio.create_task(self.connect())
-        logging.info("Connection running in background. Waiting for ready.", extra={'className': self.__class__.__name__})
-        await self.wait_until_ready()
+        log.info("Discord logged in. Connecting...")
+        self.connection = asyncio.create_task(self.connect())
+        log.info("Connection running in background. Waiting for ready.")
+        ready = asyncio.create_task(self.wait_until_ready())
+        await asyncio.wait((ready, self.connection), return_when=asyncio.FIRST_COMPLETED)
+        if not ready.done():
+            #connect() gave up before we were ready (bad intents, say); don't wait forever
+            ready.cancel()
+            self.connection.result()
+            raise ConnectionError("Discord closed the connection before it was ready")
 
     async def on_ready(self):
-        logging.info(f'Logged on as {self.user}!', extra={'className': self.__class__.__name__})
+        log.info('Logged on as %s!', self.user)
+
+    #keep the authorization cache honest
+    async def on_guild_role_create(self, role):
+        self.authorizer.forgetGuild(role.guild)
+
+    async def on_guild_role_delete(self, role):
+        self.authorizer.forgetGuild(role.guild)
+
+    async def on_guild_role_update(self, before, after):
+        self.authorizer.forgetGuild(after.guild)
 
+    async def on_member_update(self, before, after):
+        #only delivered with the (privileged) members intent; otherwise the TTL catches role changes
+        self.authorizer.forgetMember(after)
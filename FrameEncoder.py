@@ -0,0 +1,57 @@
+#Builds the APRS message frames we transmit, as bytes ready for the socket (APRSIS adds the CRLF).
+#    FROM>APP614,TCPIP*::ADDRESSEE:text{msgNo      a message (APRS 1.0.1, chapter 14)
+#    FROM>APP614,TCPIP*::ADDRESSEE:ackmsgNo        an ACK (or rej, for a REJ)
+#The addressee is padded to 9 characters. Message text is at most 67 printable ASCII characters,
+#and may not contain |, ~ or { (we also drop :, as we always have). A message number is at most 5.
+#Everything up to the second colon only depends on (from, to), so it's built once per pair.
+from functools import lru_cache
+import textwrap
+
+TOCALL = "APP614" #our software's destination callsign
+MAX_TEXT = 67     #characters of message text per frame
+MAX_MSGNO = 5     #characters of message number
+
+#the bytes sanitize() drops: control characters, and the ones the spec (or we) reserve.
+#Tabs and line breaks aren't among them; they separate words, so they become spaces.
+_DROP = bytes(set(range(32))-set(b"\t\n\x0b\x0c\r"))+b"\x7f{|~:"
+
+@lru_cache(maxsize=1024)
+def header(fromCall: str, toCall: str) -> bytes:
+    return (fromCall+">"+TOCALL+",TCPIP*::"+toCall.ljust(9, " ")+":").encode("ascii", "ignore")
+
+def sanitize(text: str) -> bytes:
+    #message text we're allowed to send, however long it is, with each run of whitespace
+    #(a line break, say) as one space
+    return b" ".join(text.encode("ascii", "ignore").translate(None, _DROP).split())
+
+def message(fromCall: str, toCall: str, text: bytes, msgNo) -> bytes:
+    #text is sanitize()d (or split()) already, and no longer than MAX_TEXT
+    return header(fromCall, toCall)+text+b"{"+str(msgNo).encode("ascii")
+
+def ack(fromCall: str, toCall: str, msgNo) -> bytes:
+    return header(fromCall, toCall)+b"ack"+str(msgNo).encode("ascii")
+
+def rej(fromCall: str, toCall: str, msgNo) -> bytes:
+    return header(fromCall, toCall)+b"rej"+str(msgNo).encode("ascii")
+
+def split(text: str, width: int = MAX_TEXT) -> list:
+    #the text as one frame's worth of bytes, or if it won't fit, as several numbered "(1/3) ..." ones,
+    #broken between words where there's a space to break at
+    clean = sanitize(text)
+    if len(clean) <= width:
+        return [clean]
+    clean = clean.decode("ascii")
+    count = 9
+    while True:
+        #the prefix gets longer once there are 10 parts (or 100); go round again if it did
+        room = width-len("(%d/%d) " % (count, count))
+        parts = textwrap.wrap(clean, room, break_long_words=True, break_on_hyphens=False) or [""]
+        if len(str(len(parts))) <= len(str(count)):
+            break
+        count = len(parts)
+    return [("(%d/%d) %s" % (number, len(parts), part)).encode("ascii") for number, part in enumerate(parts, 1)]
+
+@lru_cache(maxsize=1024)
+def callsignFromNick(nick: str) -> str:
+    #"Name | CALLSIGN" -> the callsign, as something APRS-IS will take
+    return nick.split('|')[1].strip().upper().replace('Ø','0').encode('ascii', 'ignore').decode('ascii')
@@ -0,0 +1,161 @@
+#The full Discord bot: logs in over the gateway, posts each station's messages in its own thread,
+#and relays replies from club members in those threads back over APRS.
+import asyncio
+import re
+
+import discord
+
+from DiscordClient import DiscordClient
+from Sink import Sink, SinkError
+import FrameEncoder
+import Log
+
+log = Log.getLogger("discord")
+
+class GatewaySink(Sink):
+    name = "gateway"
+
+    def __init__(self, client: DiscordClient, botSecret: str = None):
+        self.client = client
+        self.botSecret = botSecret
+        self.relay = None
+
+    @classmethod
+    def fromArgs(cls, args, router, stations):
+        intents = discord.Intents.default()
+        intents.message_content = True
+        client = DiscordClient(args.botNick, maxStations=args.maxStations, requiredRoles=args.requiredRoles.split(','), stations=stations, batchWindow=args.batchWindow, intents=intents)
+        client.router = router
+        return cls(client, args.botSecret)
+
+    async def start(self, bridge):
+        await self.client.boot(self.botSecret)
+        await self.client.change_presence(status=discord.Status.online, activity=discord.Activity(type=discord.ActivityType.listening, name='APRS-IS for "'+', '.join(self.client.router.calls())+'"'))
+        log.info("Discord ready.. fetching channels.")
+        for route in self.client.router:
+            route.channel = self.client.get_channel(route.channelId)
+            log.info("Discord will use channel %s for %s", route.channel, route.botCall)
+
+        #This is commented out for a reason
+        #You can run this to purge the bot's old messages
+        #dangerous if you don't know what you're doing!
+        #delete my old messages
+        #todel=set()
+        #async for message in myDiscordClient.targetChannel.history(limit = 100):
+        #    if message.author.name == 'aprsbot':
+        #        todel.add(message)
+        #for message in todel:
+        #    await message.delete()
+        #for thread in myDiscordClient.targetChannel.threads:
+        #    await thread.delete()
+
+        self.relay = asyncio.create_task(bridgeFromDiscordtoAPRS(self.client, bridge.sendScheduler))
+
+    async def deliver(self, route, callsign, embed):
+        try:
+            #the station's thread, wherever it is (or a new one)
+            targetThread = await self.client.threads.resolve(route, callsign)
+        except (discord.HTTPException, asyncio.TimeoutError) as exp:
+            raise SinkError("Couldn't get a Discord thread for "+callsign+": "+str(exp)) from exp
+        #send message in thread, along with whatever else arrives for it in the next moment
+        return self.client.posts.post(targetThread, discord.Embed.from_dict(embed))
+
+    async def close(self, timeout=10):
+        if self.relay:
+            self.relay.cancel()
+        #posts first: those messages have been heard, and are only ACKed once they're up
+        deadline = asyncio.get_running_loop().time()+timeout
+        await self.client.posts.close(timeout=timeout)
+        log.info('setting status offline')
+        try:
+            await asyncio.wait_for(self.client.change_presence(status=discord.Status.offline, activity=None), timeout=max(0, deadline-asyncio.get_running_loop().time()))
+        except asyncio.TimeoutError:
+            log.warning("Couldn't set status offline in time")
+        log.info('closing discord')
+        await self.client.close()
+        log.info('discord is closed.')
+
+def relayable(DiscordClient, message) -> bool:
+    #whether a Discord message is a reply, from someone allowed to send one, in a station's thread.
+    #It's wait_for()'s check, so it runs for every message the bot can see.
+
+    #don't talk to yourself, silly bot
+    if message.author == DiscordClient.user:
+        return False
+
+    #not doing anything with replies for now
+    if message.reference:
+        log.info('(this is a reply to item %s', message.reference)
+        #but the message content should still work, if it's in a thread
+
+    #only listen in the authorized channels
+    try:
+        route = DiscordClient.router.forChannel(message.channel.parent.id)
+        if route:
+            #this message is in a thread, in one of my channels...
+            log.info("%s sent a threaded message in my channel for %s", message.author.nick, route.botCall)
+            if(re.search(' via APRS$',message.channel.name)):
+                fromCall = re.split(' via APRS$',message.channel.name)[0]
+                if DiscordClient.threadFor(route.botCall, fromCall) is None:
+                    log.info("(which is a reply to an old thread of mine. Adding it to lastHeard.")
+                    DiscordClient.rememberThread(route.botCall, fromCall, message.channel.id)
+        else:
+            log.debug('Not for me, but a threaded message from %s in %s: %s', message.author.nick, message.channel.name, message.content)
+            return False
+    except AttributeError:
+        log.debug('Not for me, but a message from %s in %s: %s', message.author.nick, message.channel.name, message.content)
+        return False
+
+    #only allow club members to use this feature
+    if not DiscordClient.authorizer.isAuthorized(message.author):
+        log.info("But they're not allowed to send radio messages without the roles: %s", DiscordClient.authorizer.requiredRoles)
+        return False
+    log.info('(sent by a club member who may use this service')
+
+    callsign = DiscordClient.callsignForThread(message.channel.id)
+    if callsign:
+        #this must be an APRS client thread!
+        log.info('(which I recognize as a reply to %s', callsign)
+        return True
+    return False
+
+async def bridgeFromDiscordtoAPRS(DiscordClient, SendScheduler):
+    while True:
+        message = await DiscordClient.wait_for('message', check=lambda message: relayable(DiscordClient, message))
+
+        fromCall: str = FrameEncoder.callsignFromNick(message.author.nick)
+        toCall: str = DiscordClient.callsignForThread(message.channel.id)
+        route = DiscordClient.router.forChannel(message.channel.parent.id)
+        if not toCall or not route:
+            log.warning("Lost track of the station for thread %s - not forwarding.", message.channel.id)
+            continue
+        log.info("forwarding via aprs, %s -> %s: %s", fromCall, toCall, message.content, extra={"station": toCall, "operator": fromCall})
+
+        #replyMessage = await message.reply("I will try to transmit this message 3 times over the next 90 seconds. If the recipient acknowledges, then you'll see a green check mark on your message. No check mark means no acknowledgement was received; however the message might still have been delivered.", delete_after=90) 
+        await message.add_reaction('\N{outbox tray}')
+        #don't wait around for the ACK here; the scheduler sends it when the station's queue gets to it
+        outcome = SendScheduler.submit(toCall = toCall, message = fromCall+"-"+message.content, fromCall = route.botCall)
+        asyncio.create_task(reactToOutcome(message, outcome))
+
+async def reactToOutcome(message, outcome: asyncio.Future):
+    try:
+        delivery = await outcome
+    except Exception as exp:
+        log.warning("Sending that message failed: %s", exp)
+        delivery = None
+    if delivery:
+        await message.add_reaction('\N{Mobile Phone with Rightwards Arrow at Left}')
+    elif delivery is not None and delivery.acked:
+        #sent in parts, and only some were ACKed: say how many
+        log.info("%d of %d parts were ACKed before the timeout.", delivery.acked, delivery.parts)
+        await message.add_reaction(partsReaction(delivery.acked))
+    else:
+        log.info("The message was not ACKed before the timeout.")
+        await message.add_reaction('\N{White Question Mark Ornament}')
+    #await replyMessage.delete()
+
+def partsReaction(count: int) -> str:
+    #a keycap digit, up to ten
+    if count >= 10:
+        return '\N{Keycap Ten}'
+    return str(count)+'\N{Variation Selector-16}\N{Combining Enclosing Keycap}'
@@ -0,0 +1,95 @@
+#A dict that only keeps the most recently used items, optionally only for so long.
+#Reading, writing or touch()ing an item makes it the newest, so a station we're actively
+#talking to stays put while ones we haven't heard from in a while fall off the end.
+#(That includes nested updates like lastHeard[call].update(...), since those read the item first.)
+#Expired items are only noticed when someone looks at them, or when they reach the old end.
+#It's necessary because clients often don't receive their ACKs (such is radio)
+import collections
+import collections.abc
+import time
+
+class _Entry:
+    __slots__ = ("value", "expires")
+
+    def __init__(self, value, expires):
+        self.value = value
+        self.expires = expires
+
+class LRUCache(collections.abc.MutableMapping):
+    def __init__(self, size: int = 10, ttl: float = None, onEvict=None, other=None, **kwargs):
+        self.size = size
+        self.ttl = ttl
+        self.onEvict = onEvict #called as onEvict(key, value) when an item is pushed out or expires
+        self.data = collections.OrderedDict()
+        self.update(other or {}, **kwargs)
+
+    def _expired(self, entry, now=None) -> bool:
+        return entry.expires is not None and entry.expires <= (now or time.monotonic())
+
+    def _evict(self, key):
+        entry = self.data.pop(key)
+        if self.onEvict:
+            self.onEvict(key, entry.value)
+
+    def __getitem__(self, key):
+        entry = self.data[key]
+        if self._expired(entry):
+            self._evict(key)
+            raise KeyError(key)
+        self.data.move_to_end(key)
+        return entry.value
+
+    def __setitem__(self, key, value):
+        expires = time.monotonic()+self.ttl if self.ttl is not None else None
+        if key in self.data:
+            entry = self.data[key]
+            entry.value = value
+            entry.expires = expires
+            self.data.move_to_end(key)
+            return
+        self.data[key] = _Entry(value, expires)
+        while len(self.data) > self.size: #gotta make room for the new value
+            self._evict(next(iter(self.data))) #pop the least recently used
+
+    def __delitem__(self, key):
+        del self.data[key]
+
+    def __contains__(self, key):
+        #looking isn't using: this doesn't refresh the item
+        entry = self.data.get(key)
+        if entry is None:
+            return False
+        if self._expired(entry):
+            self._evict(key)
+            return False
+        return True
+
+    def __iter__(self):
+        now = time.monotonic()
+        return iter([key for key, entry in self.data.items() if not self._expired(entry, now)])
+
+    def __len__(self):
+        #counts items that have expired but haven't been noticed yet
+        return len(self.data)
+
+    def touch(self, key) -> bool:
+        #refresh an item (and its ttl) without reading it
+        if key not in self:
+            return False
+        entry = self.data[key]
+        if self.ttl is not None:
+            entry.expires = time.monotonic()+self.ttl
+        self.data.move_to_end(key)
+        return True
+
+    def expire(self):
+        #drop expired items from the old end; only needed to reclaim memory early
+        now = time.monotonic()
+        while self.data:
+            key, entry = next(iter(self.data.items()))
+            if entry.expires is None or entry.expires > now:
+                break
+            self._evict(key)
+
+    def __repr__(self):
+        return self.__class__.__name__+"("+repr({key: entry.value for key, entry in self.data.items()})+")"
@@ -0,0 +1,94 @@
+#Logging setup for the bots.
+#Each subsystem logs to its own logger under "aprsbot" (aprsbot.aprs, aprsbot.discord, ...), so
+#they can be turned up or down separately. Log calls pass %-style arguments, so nothing is
+#formatted for records that are filtered out.
+#With queued=True the event loop formats the message and drops the record on a queue; a listener
+#thread does the rest and the actual writing, so a slow disk or stdout never stalls the loop. Anything that
+#leaves with os._exit() has to call shutdown() first, or the records still queued are lost.
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+
+SUBSYSTEMS = ("aprs", "discord", "bridge", "scheduler", "state", "metrics")
+
+def getLogger(subsystem: str) -> logging.Logger:
+    return logging.getLogger("aprsbot."+subsystem)
+
+#attributes every LogRecord has; anything else came in through extra= and goes into the JSON
+#(so extra= can't use one of these names: logging raises KeyError for "thread", say)
+_STANDARD = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_PLAIN = (str, int, float, bool, type(None))
+
+class _RawQueueHandler(logging.handlers.QueueHandler):
+    #The args and extra= values are live objects (packets, stations) that the loop goes on changing,
+    #so the message and traceback are formatted here, while they're still what was logged, and any
+    #extra= value that isn't a plain value is kept as its str(). Unlike QueueHandler.prepare(), this
+    #keeps the extra= fields and the traceback apart, for JSONFormatter.
+    _formatter = logging.Formatter()
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or self._formatter.formatException(record.exc_info)
+            record.exc_info = None
+        for key, value in vars(record).items():
+            if key not in _STANDARD and not isinstance(value, _PLAIN):
+                setattr(record, key, str(value))
+        return record
+
+_listener = None
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+def setup(level: str = "warning", asJSON: bool = False, queued: bool = True, levels: dict = None):
+    #levels can override the level per subsystem, e.g. {"discord": "info"}
+    global _listener
+    shutdown()
+    handler = logging.StreamHandler()
+    handler.setFormatter(JSONFormatter() if asJSON else logging.Formatter('%(asctime)s %(name)s: %(message)s'))
+
+    root = logging.getLogger()
+    root.setLevel(level.upper())
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+
+    if queued:
+        records = queue.SimpleQueue()
+        root.addHandler(_RawQueueHandler(records))
+        _listener = logging.handlers.QueueListener(records, handler, respect_handler_level=True)
+        _listener.start()
+    else:
+        root.addHandler(handler)
+
+    for subsystem, subsystemLevel in (levels or {}).items():
+        getLogger(subsystem).setLevel(subsystemLevel.upper())
+
+def shutdown():
+    #write out whatever is still queued, and stop the listener thread
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+atexit.register(shutdown)
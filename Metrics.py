@@ -0,0 +1,166 @@
+#Counters and histograms for the bridge, served in the Prometheus text format.
+#Recording is just a dict update (plus a bisect for histograms), so it's cheap enough for the packet path.
+#Everything is formatted only when somebody scrapes the endpoint.
+import asyncio
+import bisect
+import collections
+import time
+
+import Log
+
+log = Log.getLogger("metrics")
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, help: str, labels=(), registry=None):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        (registry if registry is not None else REGISTRY).append(self)
+
+    def _labelText(self, values, extra=""):
+        pairs = ['%s="%s"' % (label, str(value).replace('"', '\\"')) for label, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{"+",".join(pairs)+"}" if pairs else ""
+
+    def render(self):
+        yield "# HELP "+self.name+" "+self.help
+        yield "# TYPE "+self.name+" "+self.kind
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labels=(), registry=None, collect=None):
+        super().__init__(name, help, labels, registry)
+        self.values = collections.defaultdict(float)
+        self.collect = collect #optional: returns {label values: count} kept somewhere else
+
+    def inc(self, *labelValues, amount: float = 1):
+        self.values[labelValues] += amount
+
+    def render(self):
+        yield from super().render()
+        values = dict(self.values)
+        if self.collect:
+            values.update({(key if isinstance(key, tuple) else (key,)): value for key, value in self.collect().items()})
+        for labelValues, value in values.items():
+            yield self.name+self._labelText(labelValues)+" "+repr(float(value))
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=(), registry=None, collect=None):
+        super().__init__(name, help, labels, registry)
+        self.values = {}
+        self.collect = collect #optional: returns the current value (or {label values: value})
+
+    def set(self, value: float, *labelValues):
+        self.values[labelValues] = value
+
+    def render(self):
+        yield from super().render()
+        values = dict(self.values)
+        if self.collect:
+            current = self.collect()
+            if isinstance(current, dict):
+                values.update({(key if isinstance(key, tuple) else (key,)): value for key, value in current.items()})
+            else:
+                values[()] = current
+        for labelValues, value in values.items():
+            yield self.name+self._labelText(labelValues)+" "+repr(float(value))
+
+class Histogram(_Metric):
+    kind = "histogram"
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 90)
+
+    def __init__(self, name, help, labels=(), registry=None, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels, registry)
+        self.buckets = tuple(sorted(buckets))
+        self.series = {} #label values -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, *labelValues):
+        series = self.series.get(labelValues)
+        if series is None:
+            series = self.series[labelValues] = [0]*(len(self.buckets)+2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def time(self, *labelValues):
+        return _Timer(self, labelValues)
+
+    def render(self):
+        yield from super().render()
+        for labelValues, series in list(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets+("+Inf",), series):
+                cumulative += count
+                yield self.name+"_bucket"+self._labelText(labelValues, 'le="'+str(bound)+'"')+" "+str(cumulative)
+            yield self.name+"_count"+self._labelText(labelValues)+" "+str(cumulative)
+            yield self.name+"_sum"+self._labelText(labelValues)+" "+repr(float(series[-1]))
+
+class _Timer:
+    __slots__ = ("histogram", "labelValues", "start")
+
+    def __init__(self, histogram, labelValues):
+        self.histogram = histogram
+        self.labelValues = labelValues
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.monotonic()-self.start, *self.labelValues)
+        return False
+
+async def timed(coro, histogram: Histogram, *labelValues):
+    #await a coroutine, recording how long it took
+    with histogram.time(*labelValues):
+        return await coro
+
+REGISTRY = []
+
+def render(registry=None) -> str:
+    lines = []
+    for metric in (registry if registry is not None else REGISTRY):
+        lines.extend(metric.render())
+    return "\n".join(lines)+"\n"
+
+async def _handle(reader, writer):
+    try:
+        request = await asyncio.wait_for(reader.readline(), timeout=5)
+        while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+            pass #headers, don't care
+        if request.split(b" ")[1:2] in ([b"/metrics"], [b"/"]):
+            status, body = "200 OK", render().encode("utf-8")
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(("HTTP/1.0 "+status+"\r\nContent-Type: text/plain; version=0.0.4\r\nContent-Length: "+str(len(body))+"\r\n\r\n").encode("ascii")+body)
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+async def serve(port: int, host: str = "127.0.0.1"):
+    server = await asyncio.start_server(_handle, host, port)
+    log.info("Serving metrics on http://%s:%s/metrics", host, port)
+    return server
+
+#the bridge's metrics
+packetsReceived = Counter("aprs_packets_received_total", "Raw lines received from APRS-IS")
+packetsParsed = Counter("aprs_packets_parsed_total", "Packets fully parsed by aprslib")
+parseFailures = Counter("aprs_parse_failures_total", "Packets aprslib couldn't parse", ["type"])
+queueSeconds = Histogram("aprs_queue_seconds", "Time packets spent waiting in the packet queue")
+stageSeconds = Histogram("bridge_stage_seconds", "Time packets spent in each stage of the bridge, queueing included", ["stage"])
+ackRoundTrip = Histogram("aprs_ack_round_trip_seconds", "Time from first transmission to ACK", buckets=(0.5, 1, 2, 5, 10, 20, 30, 45, 60, 90))
+sendTries = Histogram("aprs_send_tries", "Transmissions per outbound message", ["outcome"], buckets=(1, 2, 3))
+duplicates = Counter("aprs_duplicates_total", "Retransmitted messages we'd already posted")
+aprsisConnections = Counter("aprs_is_connections_total", "Successful logins to APRS-IS", ["server"])
+aprsisReconnects = Counter("aprs_is_reconnects_total", "Times the APRS-IS connection was lost or couldn't be made")
+aprsisDowntime = Counter("aprs_is_downtime_seconds_total", "Time spent reconnecting to APRS-IS, for outages that have ended")
+aprsisOutboxDropped = Counter("aprs_is_outbox_dropped_total", "Lines held during an outage that were too old or too many to send")
+discordLatency = Histogram("discord_api_seconds", "Discord API call latency", ["call"])
+embedsPerSend = Histogram("discord_embeds_per_send", "APRS messages posted per Discord API call", buckets=(1, 2, 3, 5, 10))
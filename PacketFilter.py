@@ -0,0 +1,43 @@
+#A cheap first look at raw APRS-IS lines, before paying for aprslib.parse.
+#All we ever use are messages (and ACKs/REJs) addressed to us, which look like
+#    SRC>DEST,PATH::ADDRESSEE:text{msgNo
+#so a few byte slices tell us whether a line is worth parsing properly.
+#Everything else is dropped here and counted by reason.
+import collections
+
+class PacketFilter:
+    def __init__(self, addressees):
+        self.addressees = {addressee.upper().encode("ascii") for addressee in addressees}
+        self.counts = collections.Counter() #kind or drop reason -> how many lines
+
+    def classify(self, line: bytes) -> str:
+        #returns "message", "ack", "rej" or "thirdparty" for lines worth parsing, None for the rest
+        if isinstance(line, str):
+            line = line.encode("utf-8", "ignore")
+
+        header, sep, info = line.partition(b":")
+        if not sep or header.find(b">") < 1:
+            return self._drop("malformed")
+
+        if info[:1] == b"}":
+            #third-party (gated) packet: the real one is inside, let aprslib unwrap it
+            return self._keep("thirdparty")
+
+        #the addressee is always padded to 9 characters, so the second colon sits at a fixed spot
+        if info[:1] != b":" or info[10:11] != b":":
+            return self._drop("notmessage")
+        if info[1:10].rstrip(b" ").upper() not in self.addressees:
+            return self._drop("notforme")
+
+        text = info[11:]
+        if text[:3] in (b"ack", b"rej") and 0 < len(text)-3 <= 5 and text[3:].isalnum():
+            return self._keep(text[:3].decode("ascii"))
+        return self._keep("message")
+
+    def _keep(self, kind: str) -> str:
+        self.counts[kind] += 1
+        return kind
+
+    def _drop(self, reason: str):
+        self.counts[reason] += 1
+        return None
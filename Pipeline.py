@@ -0,0 +1,115 @@
+#The APRS -> Discord side of the bridge, in stages:
+#    ingest   raw lines off the packet queue
+#    parse    aprslib.parse, inline or (for lots of traffic) in a process pool
+#    route    ACKs and REJs are handled right here; messages go to a shard by sender
+#    dedup    decide whether a message is new, and ACK the ones we've already posted
+#    deliver  post it to Discord, then ACK it
+#Each shard has its own dedup and deliver workers, so a station's messages stay in order while a
+#slow Discord call only holds up the stations that share its shard. Every queue between stages is
+#bounded: when a stage falls behind, the one before it waits, all the way back to the socket.
+#Time spent in each stage (queueing included) goes to Metrics.stageSeconds.
+import asyncio
+import concurrent.futures
+import time
+
+import aprslib
+
+import Metrics
+import Log
+
+log = Log.getLogger("bridge")
+
+def parse(line) -> tuple:
+    #(packet, None), or (None, the name of the exception). Runs in the pool, so errors come back
+    #as names: aprslib's exceptions don't survive pickling.
+    try:
+        return aprslib.parse(line), None
+    except (aprslib.ParseError, aprslib.UnknownFormat) as exp:
+        return None, exp.__class__.__name__
+
+class Pipeline:
+    def __init__(self, source: asyncio.Queue, route, accept, deliver, shards: int = 16, depth: int = 100, parseWorkers: int = 0):
+        self.source = source    #(time queued, raw line), from APRSClient
+        self.route = route      #route(packet) -> the key to shard by, or None if it's been dealt with
+        self.accept = accept    #accept(packet) -> whether deliver should have it
+        self.deliver = deliver  #coroutine function, deliver(packet)
+        self.pool = concurrent.futures.ProcessPoolExecutor(parseWorkers) if parseWorkers else None
+        self.parsed = asyncio.Queue(maxsize=max(1, parseWorkers*4)) #parses in flight, in arrival order
+        self.inboxes = [asyncio.Queue(maxsize=depth) for shard in range(shards)]    #waiting for dedup
+        self.outboxes = [asyncio.Queue(maxsize=depth) for shard in range(shards)]   #waiting for delivery
+        self.tasks = []
+
+    def queueDepths(self) -> dict:
+        return {
+            "parse": self.parsed.qsize(),
+            "dedup": sum(inbox.qsize() for inbox in self.inboxes),
+            "deliver": sum(outbox.qsize() for outbox in self.outboxes),
+        }
+
+    async def run(self):
+        self.tasks = [asyncio.create_task(self._ingest()), asyncio.create_task(self._route())]
+        for inbox, outbox in zip(self.inboxes, self.outboxes):
+            self.tasks.append(asyncio.create_task(self._dedup(inbox, outbox)))
+            self.tasks.append(asyncio.create_task(self._deliver(outbox)))
+        try:
+            await asyncio.gather(*self.tasks)
+        finally:
+            for task in self.tasks:
+                task.cancel()
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+            if self.pool:
+                self.pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _ingest(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            queued, line = await self.source.get()
+            Metrics.queueSeconds.observe(time.monotonic()-queued)
+            log.debug("found a packet on the queue: %r", line)
+            if self.pool:
+                #parse in parallel; _route still takes the results in the order they came in
+                await self.parsed.put((time.monotonic(), loop.run_in_executor(self.pool, parse, line)))
+            else:
+                await self.parsed.put((time.monotonic(), parse(line)))
+            self.source.task_done()
+
+    async def _route(self):
+        while True:
+            stamp, result = await self.parsed.get()
+            if isinstance(result, asyncio.Future):
+                result = await result
+            packet, error = result
+            Metrics.stageSeconds.observe(time.monotonic()-stamp, "parse")
+            if error:
+                log.info("Parsing that packet failed - unknown format.")
+                Metrics.parseFailures.inc(error)
+                continue
+            Metrics.packetsParsed.inc()
+            try:
+                key = self.route(packet)
+            except Exception:
+                log.exception("Routing a packet failed")
+                continue
+            if key is not None:
+                await self.inboxes[hash(key) % len(self.inboxes)].put((time.monotonic(), packet))
+
+    async def _dedup(self, inbox: asyncio.Queue, outbox: asyncio.Queue):
+        while True:
+            stamp, packet = await inbox.get()
+            try:
+                accepted = self.accept(packet)
+            except Exception:
+                log.exception("Checking a message from %s failed", packet.get('from'), extra={"station": packet.get('from')})
+                accepted = False
+            Metrics.stageSeconds.observe(time.monotonic()-stamp, "dedup")
+            if accepted:
+                await outbox.put((time.monotonic(), packet))
+
+    async def _deliver(self, outbox: asyncio.Queue):
+        while True:
+            stamp, packet = await outbox.get()
+            try:
+                await self.deliver(packet)
+            except Exception:
+                log.exception("Delivering a message from %s failed", packet.get('from'), extra={"station": packet.get('from')})
+            Metrics.stageSeconds.observe(time.monotonic()-stamp, "deliver")
@@ -0,0 +1,83 @@
+#Collects the embeds we post to Discord, per thread, and sends them in as few API calls as possible.
+#A burst from one station used to be one send() per message, which ran into Discord's per-channel
+#rate limit, and then discord.py sat on each request until the limit reset.
+#Each thread gets a queue and a worker: the worker waits `window` seconds for the rest of a burst,
+#then sends up to 10 embeds (Discord's limit) per message. Each thread also has a token bucket
+#sized under Discord's limit, so we wait for budget ourselves instead of being told to by a 429.
+#post() hands back a future for the post, so whoever queued a message can tell when it's up (and
+#only then ACK it): it resolves once the message is posted, or fails with the HTTPException that
+#stopped it, or is cancelled if close() runs out of time before it goes.
+import asyncio
+
+import discord
+
+from LRUCache import LRUCache
+from TokenBucket import TokenBucket
+import Metrics
+import Log
+
+log = Log.getLogger("discord")
+
+MAX_EMBEDS = 10 #per message, Discord's rule
+
+class PostBatcher:
+    def __init__(self, window: float = 0.5, rate: float = 1, burst: float = 5, maxThreads: int = 1000):
+        self.window = window
+        self.rate = rate
+        self.burst = burst
+        self.queues = {}    #thread id -> list of (embed, future) waiting to go out
+        self.workers = {}   #thread id -> the task sending them
+        self.budgets = LRUCache(size=maxThreads) #thread id -> TokenBucket, kept between bursts
+
+    def post(self, thread, embed: discord.Embed) -> asyncio.Future:
+        posted = asyncio.get_running_loop().create_future()
+        self.queues.setdefault(thread.id, []).append((embed, posted))
+        if thread.id not in self.workers:
+            self.workers[thread.id] = asyncio.create_task(self._drain(thread))
+        return posted
+
+    def queueDepths(self) -> dict:
+        return {threadId: len(queue) for threadId, queue in self.queues.items()}
+
+    def _budget(self, threadId) -> TokenBucket:
+        budget = self.budgets.get(threadId)
+        if budget is None:
+            budget = self.budgets[threadId] = TokenBucket(self.rate, self.burst)
+        return budget
+
+    async def _drain(self, thread):
+        queue = self.queues[thread.id]
+        try:
+            await asyncio.sleep(self.window) #let the rest of the burst arrive
+            while queue:
+                await self._budget(thread.id).take() #by the time we have budget, more may have queued
+                batch = queue[:MAX_EMBEDS]
+                del queue[:MAX_EMBEDS]
+                try:
+                    await Metrics.timed(thread.send(embeds=[embed for embed, posted in batch]), Metrics.discordLatency, "send")
+                except discord.HTTPException as exp:
+                    log.warning("Couldn't post %d messages to thread %s: %s", len(batch), thread.id, exp, extra={"threadId": thread.id})
+                    for embed, posted in batch:
+                        posted.set_exception(exp)
+                except asyncio.CancelledError:
+                    queue[:0] = batch #we don't know whether it made it, so it counts as dropped
+                    raise
+                else:
+                    Metrics.embedsPerSend.observe(len(batch))
+                    for embed, posted in batch:
+                        posted.set_result(True)
+        finally:
+            del self.workers[thread.id]
+            del self.queues[thread.id]
+            if queue: #only if we were cancelled
+                log.warning("Dropped %d messages for thread %s", len(queue), thread.id, extra={"threadId": thread.id})
+                for embed, posted in queue:
+                    posted.cancel()
+
+    async def close(self, timeout: float = 10):
+        #let what's queued go out, for up to timeout seconds; whatever's left then is dropped
+        if self.workers:
+            await asyncio.wait(list(self.workers.values()), timeout=timeout)
+        for worker in list(self.workers.values()):
+            worker.cancel()
+        await asyncio.gather(*self.workers.values(), return_exceptions=True)
@@ -0,0 +1,50 @@
+#Decides whether a Discord member may transmit over APRS.
+#A member needs every one of the required roles. Role names are resolved to ids once per guild
+#(and again whenever the guild's roles change), so each check is just a subset test on role ids.
+#Answers are cached per member for a while, and dropped early when Discord tells us the member changed.
+#With no required roles at all (an empty --requiredRoles, say), nobody may transmit: this is a
+#licence to put things on air, so a missing setting fails closed, not open.
+
+from LRUCache import LRUCache
+import Log
+
+log = Log.getLogger("discord")
+
+class RoleAuthorizer:
+    def __init__(self, requiredRoles, ttl: float = 300, maxMembers: int = 1000):
+        self.requiredRoles = [role.strip() for role in requiredRoles if role.strip()]
+        self.roleIds = {}   #guild id -> frozenset of required role ids (None if a role doesn't exist there)
+        self.members = LRUCache(size=maxMembers, ttl=ttl)   #(guild id, member id) -> authorized
+        if not self.requiredRoles:
+            log.warning("No required roles are configured; nobody can transmit.")
+
+    def _resolve(self, guild):
+        byName = {role.name: role.id for role in guild.roles}
+        missing = [name for name in self.requiredRoles if name not in byName]
+        if missing:
+            log.warning("Guild %s has no role named %s; nobody can transmit.", guild.name, missing)
+            self.roleIds[guild.id] = None
+        else:
+            self.roleIds[guild.id] = frozenset(byName[name] for name in self.requiredRoles)
+        return self.roleIds[guild.id]
+
+    def isAuthorized(self, member) -> bool:
+        guild = member.guild
+        key = (guild.id, member.id)
+        cached = self.members.get(key)
+        if cached is not None:
+            return cached
+
+        required = self.roleIds[guild.id] if guild.id in self.roleIds else self._resolve(guild)
+        authorized = bool(required) and required.issubset(role.id for role in member.roles)
+        self.members[key] = authorized
+        return authorized
+
+    def forgetGuild(self, guild):
+        #roles were created, renamed or deleted: resolve again on the next check
+        self.roleIds.pop(guild.id, None)
+        for key in [key for key in self.members if key[0] == guild.id]:
+            del self.members[key]
+
+    def forgetMember(self, member):
+        self.members.pop((member.guild.id, member.id), None)
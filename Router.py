@@ -0,0 +1,51 @@
+#Maps bot callsigns (with SSIDs) to the Discord channels they bridge.
+#One process can serve several: PPRAA-1 -> #net-control, PPRAA-2 -> #events, and so on.
+#Inbound packets are routed by their addressee, outbound Discord messages by their channel.
+class Route:
+    def __init__(self, botCall: str, channelId: int):
+        self.botCall = botCall.upper()
+        self.channelId = int(channelId)
+        self.channel = None #filled in once Discord is ready
+
+    def __repr__(self):
+        return self.botCall+"->"+str(self.channelId)
+
+class Router:
+    def __init__(self, routes):
+        self.byCall = {}
+        self.byChannel = {}
+        for route in routes:
+            if route.botCall in self.byCall or route.channelId in self.byChannel:
+                raise ValueError("Duplicate route: "+repr(route))
+            self.byCall[route.botCall] = route
+            self.byChannel[route.channelId] = route
+
+    @classmethod
+    def parse(cls, specs):
+        #specs look like "PPRAA-1=1234567890"
+        routes = []
+        for spec in specs:
+            botCall, sep, channelId = spec.partition("=")
+            if not sep or not botCall.strip() or not channelId.strip().isdigit():
+                raise ValueError("Routes look like CALL-SSID=channelID, not "+repr(spec))
+            routes.append(Route(botCall.strip(), channelId.strip()))
+        return cls(routes)
+
+    def __iter__(self):
+        return iter(self.byCall.values())
+
+    def __len__(self):
+        return len(self.byCall)
+
+    def calls(self):
+        return list(self.byCall)
+
+    def forCall(self, addressee: str) -> Route:
+        return self.byCall.get((addressee or "").strip().upper())
+
+    def forChannel(self, channelId: int) -> Route:
+        return self.byChannel.get(channelId)
+
+    def aprsFilter(self) -> str:
+        #one APRS-IS group filter for all of our callsigns
+        return "g/"+"/".join(self.byCall)
@@ -0,0 +1,59 @@
+#Schedules outbound APRS messages.
+#Each destination callsign gets its own queue, worked by its own task, so a station sees our
+#messages in order with only one outstanding at a time. Different stations proceed in parallel,
+#up to maxConcurrent at once. (The transmit budget itself lives on APRSClient, so ACKs count too.)
+#submit() hands back a future that resolves to the ACK outcome of that message (an APRSClient.Delivery).
+import asyncio
+import collections
+
+import Log
+
+log = Log.getLogger("scheduler")
+
+class SendScheduler:
+    def __init__(self, APRSClient, maxConcurrent: int = 4):
+        self.APRSClient = APRSClient
+        self.concurrency = asyncio.Semaphore(maxConcurrent)
+        self.queues = {}    #toCall -> deque of (message, fromCall, future)
+        self.workers = {}   #toCall -> the task draining that queue
+
+    def submit(self, toCall: str, message: str, fromCall: str = None) -> asyncio.Future:
+        outcome = asyncio.get_running_loop().create_future()
+        self.queues.setdefault(toCall, collections.deque()).append((message, fromCall, outcome))
+        if toCall not in self.workers:
+            self.workers[toCall] = asyncio.create_task(self._drain(toCall))
+        log.info("queued a message for %s, %d waiting", toCall, len(self.queues[toCall]), extra={"station": toCall})
+        return outcome
+
+    def queueDepths(self) -> dict:
+        return {toCall: len(queue) for toCall, queue in self.queues.items()}
+
+    async def _drain(self, toCall: str):
+        queue = self.queues[toCall]
+        try:
+            while queue:
+                message, fromCall, outcome = queue.popleft()
+                if outcome.cancelled():
+                    continue
+                try:
+                    async with self.concurrency:
+                        acked = await self.APRSClient.send_aprs_msg(toCall=toCall, message=message, fromCall=fromCall)
+                except asyncio.CancelledError:
+                    outcome.cancel() #the one in flight goes with the rest
+                    raise
+                except Exception as exp:
+                    if not outcome.done():
+                        outcome.set_exception(exp)
+                else:
+                    if not outcome.done():
+                        outcome.set_result(acked)
+        finally:
+            del self.workers[toCall]
+            del self.queues[toCall]
+            for _, _, outcome in queue: #only non-empty if we were cancelled
+                outcome.cancel()
+
+    async def close(self):
+        for worker in list(self.workers.values()):
+            worker.cancel()
+        await asyncio.gather(*self.workers.values(), return_exceptions=True)
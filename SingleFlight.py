@@ -0,0 +1,28 @@
+#Per-key single flight for things we do per station: concurrent callers for the same key share
+#one in-flight coroutine and its result (or exception). Once it's finished, the next caller starts a fresh one.
+import asyncio
+
+class SingleFlight:
+    def __init__(self):
+        self.inflight = {} #key -> task
+
+    async def do(self, key, factory):
+        #factory is called (to make the coroutine) only if nothing is in flight for key
+        task = self.inflight.get(key)
+        if task is None:
+            task = self.inflight[key] = asyncio.create_task(factory())
+            task.add_done_callback(lambda done: self._landed(key, done))
+        #shielded, so one impatient caller being cancelled doesn't cancel it for everyone
+        return await asyncio.shield(task)
+
+    def _landed(self, key, task):
+        if self.inflight.get(key) is task:
+            del self.inflight[key]
+        if not task.cancelled():
+            task.exception() #whoever was waiting has seen it; don't warn that nobody did
+
+    def __contains__(self, key):
+        return key in self.inflight
+
+    def __len__(self):
+        return len(self.inflight)
@@ -0,0 +1,29 @@
+#Where the bridge engine sends what it hears: a Discord sink.
+#GatewaySink logs in as a bot (discord.py), gives each station a thread, and relays replies back
+#over APRS. WebhookSink only posts to a webhook, so it never loads discord.py or opens a gateway
+#connection. The engine doesn't care which one it has.
+class SinkError(Exception):
+    #deliver() couldn't get the message to Discord; the engine won't ACK it, so the station retries
+    pass
+
+class Sink:
+    name = None
+
+    async def start(self, bridge):
+        #bridge is the engine, for sinks that also send things the other way
+        pass
+
+    async def deliver(self, route, callsign: str, embed: dict):
+        #post a message from callsign, for the given route. Raises SinkError if it can't.
+        #A sink that posts later, from a queue, may return a future for the post instead: the engine
+        #only ACKs the message once it resolves, and not at all if it fails or is cancelled.
+        #Returning None means that as far as the sink will ever know, the message is posted.
+        raise NotImplementedError
+
+    async def announce(self, text: str):
+        #a notice for the channel(s), like the bot coming online
+        pass
+
+    async def close(self, timeout: float = 10):
+        #let whatever's queued go out, for up to timeout seconds, then hang up
+        pass
@@ -0,0 +1,133 @@
+#Somewhere to keep per-station state across restarts: message numbers, and which Discord
+#thread belongs to which station. Without it, a restart forgets what we've already posted,
+#so retransmitted messages get posted again and stations get a second thread.
+#
+#Values are small dicts, filed under a namespace ("station") and a key (the callsign).
+#Reads are lazy: nothing is loaded at startup, a station is looked up the first time it's needed.
+#Writes never wait on the disk: SqliteStateStore collects them and flushes in batches from a
+#background thread.
+import asyncio
+import concurrent.futures
+import json
+import sqlite3
+
+from LRUCache import LRUCache
+import Log
+
+log = Log.getLogger("state")
+
+class StateStore:
+    async def start(self):
+        pass
+
+    def get(self, namespace: str, key: str) -> dict:
+        raise NotImplementedError
+
+    def put(self, namespace: str, key: str, value: dict):
+        raise NotImplementedError
+
+    def delete(self, namespace: str, key: str):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+class MemoryStateStore(StateStore):
+    #forgets everything on restart, just like the bot used to, and all but the most recent
+    #size entries before then, so it stays as small as the ring it replaced
+    def __init__(self, size: int = 1000):
+        self.data = LRUCache(size=size)
+
+    def get(self, namespace, key):
+        return self.data.get((namespace, key))
+
+    def put(self, namespace, key, value):
+        self.data[(namespace, key)] = dict(value)
+
+    def delete(self, namespace, key):
+        self.data.pop((namespace, key), None)
+
+class SqliteStateStore(StateStore):
+    _DELETED = object()
+
+    def __init__(self, path: str, flushInterval: float = 2, maxPending: int = 1000):
+        self.path = path
+        self.flushInterval = flushInterval
+        self.maxPending = maxPending
+        self.pending = {}   #(namespace, key) -> value (or _DELETED), written at the next flush
+        self.flushing = {}  #the batch being written right now, which the database may not have yet
+        self.flushNow = asyncio.Event()
+        self.flusher = None
+
+        #the writer connection lives on the one executor thread; this one is only for lookups
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="StateStore")
+        self.writer = None
+        self.reader = sqlite3.connect(path)
+        self.reader.execute("PRAGMA journal_mode=WAL") #so lookups don't wait behind a flush
+        self.reader.execute("CREATE TABLE IF NOT EXISTS state (namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (namespace, key))")
+        self.reader.commit()
+
+    async def start(self):
+        self.flusher = asyncio.create_task(self._flushLoop())
+
+    def get(self, namespace, key):
+        for unwritten in (self.pending, self.flushing):
+            if (namespace, key) in unwritten:
+                value = unwritten[(namespace, key)]
+                return None if value is self._DELETED else dict(value)
+        row = self.reader.execute("SELECT value FROM state WHERE namespace = ? AND key = ?", (namespace, key)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, namespace, key, value):
+        self.pending[(namespace, key)] = dict(value)
+        if len(self.pending) >= self.maxPending:
+            self.flushNow.set()
+
+    def delete(self, namespace, key):
+        self.pending[(namespace, key)] = self._DELETED
+
+    def _write(self, batch):
+        #runs on the executor thread
+        if self.writer is None:
+            self.writer = sqlite3.connect(self.path)
+            self.writer.execute("PRAGMA synchronous=NORMAL")
+        with self.writer:
+            self.writer.executemany("INSERT OR REPLACE INTO state (namespace, key, value) VALUES (?, ?, ?)",
+                [(namespace, key, json.dumps(value)) for (namespace, key), value in batch.items() if value is not self._DELETED])
+            self.writer.executemany("DELETE FROM state WHERE namespace = ? AND key = ?",
+                [(namespace, key) for (namespace, key), value in batch.items() if value is self._DELETED])
+
+    async def flush(self):
+        if not self.pending:
+            return
+        batch = self.flushing = self.pending
+        self.pending = {}
+        try:
+            await asyncio.get_running_loop().run_in_executor(self.executor, self._write, batch)
+        except sqlite3.Error as exp:
+            log.warning("Couldn't save state to %s: %s", self.path, exp)
+            #put it back, unless something newer came along in the meantime
+            self.pending = {**batch, **self.pending}
+        finally:
+            self.flushing = {}
+
+    async def _flushLoop(self):
+        while True:
+            #a timer, not wait_for(), which can lose close()'s cancel on Python < 3.12
+            timer = asyncio.get_running_loop().call_later(self.flushInterval, self.flushNow.set)
+            try:
+                await self.flushNow.wait()
+            finally:
+                timer.cancel()
+            self.flushNow.clear()
+            await self.flush()
+
+    async def close(self):
+        if self.flusher:
+            self.flusher.cancel()
+            await asyncio.gather(self.flusher, return_exceptions=True)
+        await self.flush()
+        if self.writer is not None:
+            await asyncio.get_running_loop().run_in_executor(self.executor, self.writer.close)
+        self.executor.shutdown()
+        self.reader.close()
@@ -0,0 +1,86 @@
+#Everything we track per station, in one place: the messages we've heard from it lately (see
+#Dedup.py), the next message number we'll use with it, and its Discord thread on each route.
+#(Which of our messages it has ACKed lives in APRSClient.pendingAcks, only while someone's waiting.)
+#APRSClient and DiscordClient used to keep separate maps of nested dicts (with a set of ACKs that
+#only ever grew); now they share one registry of small slotted records.
+#Only the most recently used stations stay in memory; with a state store, the rest are loaded from
+#it when they're needed again. Without one, the registry is all there is: nothing is copied anywhere.
+import array
+
+from LRUCache import LRUCache
+
+class Station:
+    __slots__ = ("callsign", "seen", "nextMsgNo", "threads")
+
+    def __init__(self, callsign: str, seen: array.array = None, nextMsgNo: int = 1, threads: dict = None):
+        self.callsign = callsign
+        self.seen = seen            #array("I") of Dedup.key, when we posted it, ..., oldest first, or None
+        self.nextMsgNo = nextMsgNo  #the next message number to use with this station
+        self.threads = threads      #botCall -> discord thread id, or None if there aren't any
+
+    def takeMsgNo(self) -> int:
+        msgNo = self.nextMsgNo
+        self.nextMsgNo += 1
+        return msgNo
+
+    def asDict(self) -> dict:
+        return {"seen": list(self.seen or ()), "nextMsgNo": self.nextMsgNo, "threads": self.threads or {}}
+
+    @classmethod
+    def fromDict(cls, callsign: str, saved: dict, nextMsgNo: int = 1):
+        #nextMsgNo is for a station we have nothing saved for
+        seen = array.array("I", saved.get("seen") or ()) or None
+        return cls(callsign, seen, int(saved.get("nextMsgNo", nextMsgNo)), dict(saved.get("threads") or {}) or None)
+
+    def __repr__(self):
+        return "Station("+self.callsign+", seen="+str(len(self.seen or ())//2)+", nextMsgNo="+str(self.nextMsgNo)+", threads="+repr(self.threads)+")"
+
+class StationRegistry:
+    def __init__(self, state=None, size: int = 1000, firstMsgNo: int = 1):
+        self.state = state #a StateStore, or None to keep stations in memory only
+        self.firstMsgNo = firstMsgNo #where message numbers start, for a station we've no record of
+        self.stations = LRUCache(size=size, onEvict=self._forget) #callsign -> Station
+        self.threadIndex = {} #thread id -> (botCall, callsign), for the stations in memory
+
+    def get(self, callsign: str) -> Station:
+        #the record for a station, loaded from the state store if we've forgotten it
+        station = self.stations.get(callsign)
+        if station is None:
+            saved = self.state.get("station", callsign) if self.state is not None else None
+            station = self.stations[callsign] = Station.fromDict(callsign, saved or {}, self.firstMsgNo)
+            for botCall, threadId in (station.threads or {}).items():
+                self.threadIndex[threadId] = (botCall, callsign)
+        return station
+
+    def save(self, station: Station):
+        if self.state is not None:
+            self.state.put("station", station.callsign, station.asDict())
+
+    def threadFor(self, botCall: str, callsign: str) -> int:
+        #the thread id for a station on a route, or None
+        threads = self.get(callsign).threads
+        return threads.get(botCall) if threads else None
+
+    def rememberThread(self, botCall: str, callsign: str, threadId: int):
+        station = self.get(callsign)
+        if station.threads is None:
+            station.threads = {}
+        old = station.threads.get(botCall)
+        if old is not None and self.threadIndex.get(old) == (botCall, callsign):
+            del self.threadIndex[old]
+        station.threads[botCall] = threadId
+        self.threadIndex[threadId] = (botCall, callsign)
+        self.save(station)
+
+    def callsignForThread(self, threadId: int) -> str:
+        key = self.threadIndex.get(threadId)
+        return key[1] if key else None
+
+    def _forget(self, callsign, station):
+        #keeps threadIndex consistent when a station is dropped from memory
+        for botCall, threadId in (station.threads or {}).items():
+            if self.threadIndex.get(threadId) == (botCall, callsign):
+                del self.threadIndex[threadId]
+
+    def __len__(self):
+        return len(self.stations)
@@ -0,0 +1,81 @@
+#Finds the Discord thread for a station, creating one only when there really isn't one.
+#channel.get_thread() only knows about active threads discord.py happens to have cached, so it
+#returns None for archived ones; and a station that fell out of lastHeard used to get a new thread.
+#In order, this tries:
+#    the thread id we remember for the station, and discord.py's cache of that thread
+#    one fetch of that thread (unarchiving it if need be)
+#    an index of the channel's "<CALL> via APRS" threads by name, archived ones included
+#    and only then, creating a thread. Creates for the same station share one request.
+import asyncio
+
+import discord
+
+from SingleFlight import SingleFlight
+import Metrics
+import Log
+
+log = Log.getLogger("discord")
+
+def threadName(callsign: str) -> str:
+    return callsign+" via APRS"
+
+class ThreadResolver:
+    def __init__(self, client, fetchTimeout: float = 10, archivedLimit: int = 200):
+        self.client = client #the DiscordClient, which remembers station -> thread id
+        self.fetchTimeout = fetchTimeout
+        self.archivedLimit = archivedLimit #how many archived threads to look through, per channel
+        self.byName = {}        #(channel id, thread name) -> thread id
+        self.indexed = set()    #channel ids whose threads are in byName
+        self.indexing = SingleFlight() #keyed by channel id
+        self.creating = SingleFlight() #keyed by (botCall, callsign)
+
+    async def resolve(self, route, callsign: str) -> discord.Thread:
+        threadId = self.client.threadFor(route.botCall, callsign)
+        if threadId is None:
+            threadId = await self._findByName(route.channel, threadName(callsign))
+            if threadId is not None:
+                log.info("found an old thread %s for %s", threadId, callsign, extra={"station": callsign, "threadId": threadId})
+                self.client.rememberThread(route.botCall, callsign, threadId)
+        if threadId is not None:
+            thread = await self._load(route.channel, threadId)
+            if thread is not None:
+                return thread
+            log.info("thread %s for %s is gone", threadId, callsign, extra={"station": callsign, "threadId": threadId})
+
+        return await self.creating.do((route.botCall, callsign), lambda: self._create(route, callsign))
+
+    async def _load(self, channel, threadId: int) -> discord.Thread:
+        #None if the thread has been deleted
+        thread = channel.get_thread(threadId)
+        if thread is None:
+            try:
+                thread = await Metrics.timed(asyncio.wait_for(self.client.fetch_channel(threadId), timeout=self.fetchTimeout), Metrics.discordLatency, "fetch_channel")
+            except discord.NotFound:
+                return None
+        if thread.archived:
+            thread = await Metrics.timed(thread.edit(archived=False), Metrics.discordLatency, "edit")
+        return thread
+
+    async def _findByName(self, channel, name: str) -> int:
+        if channel.id not in self.indexed:
+            #everyone waits for the one listing; a half-built index would send them off to create threads
+            await self.indexing.do(channel.id, lambda: self._index(channel))
+        return self.byName.get((channel.id, name))
+
+    async def _index(self, channel):
+        for thread in channel.threads:
+            self.byName[(channel.id, thread.name)] = thread.id
+        try:
+            async for thread in channel.archived_threads(limit=self.archivedLimit):
+                self.byName.setdefault((channel.id, thread.name), thread.id) #an active thread wins
+        except discord.HTTPException as exp:
+            log.warning("Couldn't list archived threads in %s: %s", channel, exp)
+        self.indexed.add(channel.id)
+
+    async def _create(self, route, callsign: str) -> discord.Thread:
+        thread = await Metrics.timed(route.channel.create_thread(name=threadName(callsign),message=None, slowmode_delay=30, type=discord.ChannelType.public_thread), Metrics.discordLatency, "create_thread")
+        self.byName[(route.channel.id, thread.name)] = thread.id
+        self.client.rememberThread(route.botCall, callsign, thread.id)
+        log.info("created thread %s", thread.id, extra={"station": callsign, "threadId": thread.id})
+        await Metrics.timed(thread.send("Licensed radio amateurs can reply in this thread. If permitted, it will be retransmitted via APRS-IS in reply to "+callsign), Metrics.discordLatency, "send")
+        return thread
@@ -0,0 +1,29 @@
+#A token bucket for pacing transmissions.
+#Tokens refill at `rate` per second up to `burst`; take() waits until one is available.
+import asyncio
+import time
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic()
+        self.lock = asyncio.Lock() #first come, first served
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens+(now-self.stamp)*self.rate)
+        self.stamp = now
+
+    def tryTake(self, tokens: float = 1) -> bool:
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    async def take(self, tokens: float = 1):
+        async with self.lock:
+            while not self.tryTake(tokens):
+                await asyncio.sleep((tokens-self.tokens)/self.rate)
@@ -0,0 +1,89 @@
+#Where outbound APRS packets go. The bot picks one at startup:
+#    live      sends them to APRS-IS, for real
+#    dryrun    sends nothing; packets are logged and the most recent ones are kept in .sent
+#    loopback  like dryrun, but every message is ACKed right back through the receive path,
+#              so the whole send/ACK pipeline runs without anything going out on air
+#Transmitting used to be switched off by setting the log level to DEBUG, which meant we
+#couldn't see debug output from a bot that was actually transmitting.
+import asyncio
+import collections
+
+import Log
+
+log = Log.getLogger("aprs")
+
+MODES = ("live", "dryrun", "loopback")
+
+class Transport:
+    name = None
+
+    async def send(self, pkt: bytes) -> bool:
+        #False if it's been held, to go out later (APRS-IS is down)
+        raise NotImplementedError
+
+class APRSISTransport(Transport):
+    name = "live"
+
+    def __init__(self, AIS):
+        self.AIS = AIS
+
+    async def send(self, pkt):
+        return await self.AIS.sendall(pkt)
+
+class DryRunTransport(Transport):
+    name = "dryrun"
+
+    def __init__(self, keep: int = 1000):
+        self.sent = collections.deque(maxlen=keep) #the most recent packets we would have sent
+
+    async def send(self, pkt):
+        self.sent.append(pkt)
+        log.debug("Not transmitted (%s): %s", self.name, pkt)
+
+class LoopbackTransport(DryRunTransport):
+    name = "loopback"
+
+    def __init__(self, receive, delay: float = 0, keep: int = 1000):
+        super().__init__(keep)
+        self.receive = receive #coroutine function that takes a raw APRS-IS line, like APRSClient.aprs_callback
+        self.delay = delay #pretend the station takes this long to ACK
+        self.tasks = set()
+
+    @staticmethod
+    def ackFor(pkt: bytes) -> bytes:
+        #the line the addressee would send back for a message, or None if pkt isn't one
+        #    FROM>APP614,TCPIP*::TOCALL   :text{msgNo  ->  TOCALL>APRS,TCPIP*::FROM     :ackmsgNo
+        if isinstance(pkt, bytes):
+            pkt = pkt.decode("ascii", "ignore")
+        header, sep, info = pkt.partition(":")
+        if not sep or info[:1] != ":" or info[10:11] != ":":
+            return None
+        text, brace, msgNo = info[11:].rpartition("{")
+        if not brace or not msgNo:
+            return None
+        fromCall = header.partition(">")[0]
+        toCall = info[1:10].rstrip(" ")
+        return (toCall+">APRS,TCPIP*::"+fromCall.ljust(9, " ")+":ack"+msgNo).encode("ascii", "ignore")
+
+    async def send(self, pkt):
+        await super().send(pkt)
+        ack = self.ackFor(pkt)
+        if ack is not None:
+            #don't make the sender wait for its own ACK to be queued
+            task = asyncio.create_task(self._echo(ack))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _echo(self, line: bytes):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        await self.receive(line)
+
+def make(mode: str, AIS=None, receive=None) -> Transport:
+    if mode == "live":
+        return APRSISTransport(AIS)
+    if mode == "dryrun":
+        return DryRunTransport()
+    if mode == "loopback":
+        return LoopbackTransport(receive)
+    raise ValueError("Unknown transport "+repr(mode)+"; use one of "+", ".join(MODES))
@@ -0,0 +1,118 @@
+#Posts to a Discord webhook from a queue, so the APRS-IS reader never waits on Discord.
+#One aiohttp session is kept for the life of the bot, so posts reuse a keep-alive connection
+#instead of a fresh TLS handshake each. Embeds that pile up while a post is in flight go out
+#together in the next one (up to 10, Discord's limit). Discord's rate-limit headers are honoured
+#before we're told off; if we are (429), we wait as long as we're told and try again.
+import asyncio
+import time
+
+import aiohttp
+
+import Metrics
+import Log
+
+log = Log.getLogger("discord")
+
+MAX_EMBEDS = 10 #per message, Discord's rule
+
+class WebhookPoster:
+    def __init__(self, url: str, username: str = None, maxQueue: int = 1000, maxTries: int = 5, timeout: float = 10):
+        self.url = url
+        self.username = username
+        self.queue = asyncio.Queue(maxsize=maxQueue) #(content, embed)
+        self.maxTries = maxTries
+        self.timeout = timeout
+        self.session = None
+        self.worker = None
+        self.carry = None #an item taken off the queue that couldn't join the last post
+        self.busy = False #a post is in flight
+        self.resumeAt = 0 #don't post before this (time.monotonic()), per Discord's rate limit
+
+    async def start(self):
+        self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        self.worker = asyncio.create_task(self._run())
+
+    async def post(self, content: str = None, embed: dict = None):
+        #waits only if the queue is full
+        await self.queue.put((content, embed))
+
+    def _next(self):
+        if self.carry is not None:
+            item, self.carry = self.carry, None
+            return item
+        return self.queue.get_nowait()
+
+    async def _run(self):
+        while True:
+            if self.carry is None:
+                self.carry = await self.queue.get()
+            content, embed = self._next()
+            embeds = [embed] if embed else []
+            #whatever embeds are already waiting can ride along
+            while embeds and len(embeds) < MAX_EMBEDS:
+                try:
+                    item = self._next()
+                except asyncio.QueueEmpty:
+                    break
+                if item[0] is not None or item[1] is None:
+                    self.carry = item #has text of its own; it gets its own post
+                    break
+                embeds.append(item[1])
+            payload = {"username": self.username, "content": content, "embeds": embeds}
+            self.busy = True
+            try:
+                if await self._send({key: value for key, value in payload.items() if value}):
+                    Metrics.embedsPerSend.observe(len(embeds))
+            finally:
+                self.busy = False
+
+    def _noteLimits(self, headers):
+        if headers.get("X-RateLimit-Remaining") == "0":
+            self.resumeAt = max(self.resumeAt, time.monotonic()+float(headers.get("X-RateLimit-Reset-After", 1)))
+
+    async def _send(self, payload: dict) -> bool:
+        for attempt in range(1, self.maxTries+1):
+            wait = self.resumeAt-time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                with Metrics.discordLatency.time("webhook"):
+                    async with self.session.post(self.url, json=payload) as response:
+                        self._noteLimits(response.headers)
+                        if response.status == 429:
+                            try:
+                                body = await response.json(content_type=None) or {}
+                            except ValueError:
+                                body = {}
+                            retryAfter = float(body.get("retry_after") or response.headers.get("Retry-After", 1))
+                            log.info("Webhook rate limited; retrying in %.1fs", retryAfter)
+                            self.resumeAt = max(self.resumeAt, time.monotonic()+retryAfter)
+                            continue
+                        if response.status < 400:
+                            return True
+                        if response.status < 500:
+                            #our fault; asking again won't help
+                            log.warning("Webhook refused the post (%s): %s", response.status, await response.text())
+                            return False
+                        log.warning("Webhook post failed (%s), attempt %d", response.status, attempt)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as exp:
+                log.warning("Webhook post failed (%s), attempt %d", exp, attempt)
+            await asyncio.sleep(min(30, 2**attempt))
+        log.warning("Giving up on a webhook post after %d tries", self.maxTries)
+        return False
+
+    async def close(self, timeout: float = 10):
+        #give whatever's queued a chance to go out, then hang up
+        try:
+            await asyncio.wait_for(self._drained(), timeout=timeout)
+        except asyncio.TimeoutError:
+            log.warning("Dropped %d webhook posts on the way out", self.queue.qsize())
+        if self.worker:
+            self.worker.cancel()
+            await asyncio.gather(self.worker, return_exceptions=True)
+        if self.session:
+            await self.session.close()
+
+    async def _drained(self):
+        while self.busy or self.carry is not None or not self.queue.empty():
+            await asyncio.sleep(0.1)
@@ -0,0 +1,31 @@
+#Posts inbound APRS messages to a Discord webhook, and that's all: no bot login, no gateway
+#connection, no threads, no replies. It doesn't import discord.py, so it starts fast and stays small.
+from Sink import Sink
+from WebhookPoster import WebhookPoster
+
+class WebhookSink(Sink):
+    name = "webhook"
+
+    def __init__(self, url: str, username: str = None):
+        self.poster = WebhookPoster(url, username=username)
+
+    @classmethod
+    def fromArgs(cls, args, router, stations):
+        return cls(args.botSecret, username=args.botNick)
+
+    async def start(self, bridge):
+        await self.poster.start()
+
+    async def deliver(self, route, callsign, embed):
+        embed = dict(embed, footer={
+            "text": "Licensed radio amateurs can post to this channel by sending APRS messages to callsign "+route.botCall+" with standard message format.",
+        })
+        #queued; this only waits if the queue is full. The webhook queue doesn't report back on each
+        #post, so the message is ACKed as soon as it's queued, and one that fails later is lost.
+        await self.poster.post(embed=embed)
+
+    async def announce(self, text):
+        await self.poster.post(content=text)
+
+    async def close(self, timeout=10):
+        await self.poster.close(timeout=timeout)
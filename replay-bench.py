@@ -0,0 +1,631 @@
+#Offline load test for the APRS -> Discord bridge. No Discord token, no APRS-IS login, nothing on air.
+#A fake APRS-IS server on localhost replays traffic (recorded, from --file, or synthetic) at --rate
+#lines per second into the real APRSIS, APRSClient and bridge pipeline; a fake Discord channel
+#stands in for the API. For each station count it reports:
+#    throughput, and p50/p99 latency from a line leaving the server to its embed being posted
+#    p50/p99 latency from a line leaving the server to our ACK for it arriving back
+#    Discord API calls, and how many messages each one carried
+#    resident memory over the run
+#    with --dropEvery, how often the server hung up on us and how long we took to get back
+#With --frames, it only times building outbound APRS frames instead.
+#With --lines, it only times reading that many lines from the fake server through APRSIS instead.
+#With --lookups, it only times checking inbound Discord messages, and finding the station for a thread (and
+#back), at each --stations count.
+#With --writes, it only times sustained writes to the state stores instead.
+#With --prefilter, it only times aprslib.parse over the traffic, with and without the pre-filter in front.
+#With --logging, it only times what logging costs per packet, at WARNING and at INFO.
+#With --cache, it only compares LRUCache with the RingDict it replaced instead: speed, and how often a
+#station that's still talking is still there.
+#With --memory, it only measures memory per tracked station instead, against the nested dicts we used to keep.
+#With --acks, it only measures waiting on ACKs instead: that many messages in flight at once, how
+#much CPU and event-loop time they take while they wait, and how soon each wakes once its ACK is in.
+#    python replay-bench.py --stations 10,100,1000,10000 --messages 3 --rate 2000
+import argparse
+import asyncio
+import collections.abc
+import contextlib
+import json
+import os
+import random
+import re
+import resource
+import tempfile
+import time
+import tracemalloc
+import types
+
+import aprslib
+import discord
+
+from APRSClient import APRSClient
+from APRSIS import APRSIS
+from Bridge import Bridge
+import Dedup
+from DiscordClient import DiscordClient
+import FrameEncoder
+import GatewaySink
+from PacketFilter import PacketFilter
+from LRUCache import LRUCache
+from Router import Router
+from StateStore import MemoryStateStore, SqliteStateStore
+from StationRegistry import StationRegistry
+import Transport
+import Metrics
+import Log
+
+log = Log.getLogger("bridge")
+
+def messageKey(line: str) -> tuple:
+    #(source, addressee, msgNo) for a message line, None for anything else
+    header, sep, info = line.partition(":")
+    if not sep or info[:1] != ":" or info[10:11] != ":":
+        return None
+    text, brace, msgNo = info[11:].rpartition("{")
+    if not brace or not msgNo or text[:3] in ("ack", "rej"):
+        return None
+    return (header.partition(">")[0], info[1:10].rstrip(" "), msgNo)
+
+def synthetic(botCall: str, stations: int, messages: int, noise: float, duplicates: float, seed: int = 1) -> list:
+    #messages from each station, interleaved, with some retransmissions and some traffic that isn't for us
+    rng = random.Random(seed)
+    lines = []
+    for msgNo in range(1, messages+1):
+        for station in range(stations):
+            line = "BN%05d>APRS,TCPIP*::%s:load test message %d from station %d{%d" % (station, botCall.ljust(9, " "), msgNo, station, msgNo)
+            lines.append(line)
+            if rng.random() < duplicates:
+                lines.append(line)
+            while rng.random() < noise/(1+noise): #geometric, so `noise` of them on average
+                lines.append("N%dABC>APRS,TCPIP*:!4903.50N/07201.75W-just a position %d" % (rng.randrange(10), rng.randrange(1000)))
+    return lines
+
+def rss() -> int:
+    #resident memory in bytes, right now if we can tell, or the peak if we can't
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1])*os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*1024
+
+def percentile(values, p: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values)-1, int(len(values)*p))]
+
+class FakeAPRSIS:
+    #speaks just enough of the APRS-IS protocol, then replays lines and listens for our ACKs.
+    #With dropEvery, it hangs up after that many lines, and carries on where it left off when we reconnect.
+    def __init__(self, lines, rate: float, dropEvery: int = 0):
+        self.lines = lines
+        self.rate = rate
+        self.dropEvery = dropEvery
+        self.position = 0   #the next line to send
+        self.drops = 0
+        self.sentAt = {}    #(source, addressee, msgNo) -> when it was first sent
+        self.ackedAt = {}   #(source, addressee, msgNo) -> when our first ACK for it arrived
+        self.listeners = []
+        self.writers = []
+        self.done = asyncio.Event()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def _handle(self, reader, writer):
+        self.writers.append(writer)
+        writer.write(b"# aprsc 2.1.14-fake\r\n")
+        login = (await reader.readline()).decode("ascii", "ignore").split()
+        writer.write(("# logresp "+login[1]+" verified, server FAKE\r\n").encode("ascii"))
+        self.listeners.append(asyncio.create_task(self._listen(reader)))
+        start, first = time.monotonic(), self.position
+        while self.position < len(self.lines):
+            if self.dropEvery and self.position > first and self.position % self.dropEvery == 0:
+                self.drops += 1
+                writer.close()
+                return
+            ahead = start+(self.position-first)/self.rate-time.monotonic()
+            if ahead > 0:
+                await asyncio.sleep(ahead)
+            line = self.lines[self.position]
+            self.position += 1
+            key = messageKey(line)
+            if key and key not in self.sentAt:
+                self.sentAt[key] = time.monotonic()
+            writer.write(line.encode("ascii")+b"\r\n")
+            await writer.drain()
+        self.done.set()
+
+    async def _listen(self, reader):
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            header, sep, info = line.decode("ascii", "ignore").rstrip("\r\n").partition(":")
+            if info[11:14] == "ack":
+                key = (info[1:10].rstrip(" "), header.partition(">")[0], info[14:])
+                self.ackedAt.setdefault(key, time.monotonic())
+
+    async def close(self):
+        for listener in self.listeners:
+            listener.cancel()
+        await asyncio.gather(*self.listeners, return_exceptions=True)
+        for writer in self.writers:
+            writer.close()
+        self.server.close()
+        await self.server.wait_closed()
+
+class FakeThread:
+    def __init__(self, channel, threadId: int, name: str):
+        self.channel = channel
+        self.id = threadId
+        self.name = name
+        self.archived = False
+
+    async def send(self, content=None, embeds=None, embed=None):
+        await asyncio.sleep(self.channel.latency)
+        self.channel.calls += 1
+        now = time.monotonic()
+        for embed in embeds or ([embed] if embed else []):
+            fields = {field.name: field.value for field in embed.fields}
+            self.channel.postedAt.setdefault((self.name.split(" ")[0], str(fields.get("msgNo"))), now)
+            self.channel.embeds += 1
+
+class FakeChannel:
+    def __init__(self, channelId: int, latency: float):
+        self.id = channelId
+        self.latency = latency #every API call takes this long
+        self.threads = []
+        self.byId = {}
+        self.calls = 0
+        self.embeds = 0
+        self.postedAt = {} #(source, msgNo) -> when it was posted
+
+    def get_thread(self, threadId):
+        return self.byId.get(threadId)
+
+    async def archived_threads(self, limit=None):
+        for thread in []:
+            yield thread
+
+    async def create_thread(self, name, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.calls += 1
+        thread = FakeThread(self, 10**6+len(self.byId), name)
+        self.byId[thread.id] = thread
+        self.threads.append(thread)
+        return thread
+
+def traffic(args, stations: int) -> list:
+    #the lines to replay: recorded ones from --file, or synthetic ones for this many stations
+    if args.file:
+        with open(args.file, encoding="utf-8", errors="ignore") as recorded:
+            return [line.rstrip("\r\n") for line in recorded if line.strip() and not line.startswith("#")]
+    return synthetic(args.botCall, stations, args.messages, args.noise, args.duplicates)
+
+async def run(args, stations: int) -> dict:
+    lines = traffic(args, stations)
+    expected = {key[0::2] for key in map(messageKey, lines) if key and key[1] == args.botCall.upper()}
+
+    server = FakeAPRSIS(lines, args.rate, args.dropEvery)
+    port = await server.start()
+
+    router = Router.parse([args.botCall+"=1"])
+    channel = FakeChannel(1, args.discordLatency)
+    for route in router:
+        route.channel = channel
+    packetQueue = asyncio.Queue(maxsize=1000)
+    registry = StationRegistry(size=max(stations, 1000))
+    client = APRSClient(packetQueue, router.calls()[0], txRate=10**6, txBurst=10**6, stations=registry, addressees=router.calls(), ackRate=10**6, ackBurst=10**6)
+    client.AIS = APRSIS(args.botCall, "-1", host="127.0.0.1", port=port, backoff=args.backoff)
+    client.transport = Transport.make("live", AIS=client.AIS)
+    client.AIS.set_filter(router.aprsFilter())
+    discordClient = DiscordClient("aprsbot", stations=registry, batchWindow=args.batchWindow, intents=discord.Intents(guilds=True), requiredRoles=["Members"])
+    discordClient.router = router
+    async def fetch_channel(threadId):
+        return channel.byId[threadId]
+    discordClient.fetch_channel = fetch_channel
+
+    downtime = Metrics.aprsisDowntime.values[()]
+    memory = [(0.0, rss())]
+    start = time.monotonic()
+    async def sample():
+        while True:
+            await asyncio.sleep(args.sampleEvery)
+            memory.append((time.monotonic()-start, rss()))
+
+    tasks = [
+        asyncio.create_task(Bridge(client, router, GatewaySink.GatewaySink(discordClient), shards=args.shards, parseWorkers=args.parseWorkers).run()),
+        client.makeConsumer(),
+        asyncio.create_task(sample()),
+    ]
+    await server.done.wait()
+    deadline = time.monotonic()+args.drainTimeout
+    while len(channel.postedAt) < len(expected) and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    elapsed = time.monotonic()-start
+    memory.append((elapsed, rss()))
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await discordClient.posts.close(timeout=0)
+    await client.acks.close()
+    await client.AIS.close()
+    await server.close()
+
+    botCall = args.botCall.upper()
+    latency = [posted-server.sentAt[(source, botCall, msgNo)] for (source, msgNo), posted in channel.postedAt.items() if (source, botCall, msgNo) in server.sentAt]
+    ackLatency = [acked-server.sentAt[key] for key, acked in server.ackedAt.items() if key in server.sentAt]
+    return {
+        "stations": stations or len({source for source, msgNo in expected}),
+        "lines": len(lines),
+        "messages": len(expected),
+        "posted": len(channel.postedAt),
+        "acked": len(server.ackedAt),
+        "seconds": elapsed,
+        "throughput": len(channel.postedAt)/elapsed,
+        "latency_p50": percentile(latency, 0.5),
+        "latency_p99": percentile(latency, 0.99),
+        "ack_p50": percentile(ackLatency, 0.5),
+        "ack_p99": percentile(ackLatency, 0.99),
+        "drops": server.drops,
+        "reconnect_seconds": Metrics.aprsisDowntime.values[()]-downtime,
+        "api_calls": channel.calls,
+        "per_call": channel.embeds/channel.calls if channel.calls else 0,
+        "rss_start": memory[0][1],
+        "rss_peak": max(sample for _, sample in memory),
+        "rss_end": memory[-1][1],
+        "rss_samples": memory,
+    }
+
+def frameBench(count: int) -> dict:
+    #building outbound frames: FrameEncoder, against the string concatenation it replaced
+    texts = ["K0ABC-reply number %d, with {braces} and: colons" % n for n in range(100)]
+    calls = ["BN%05d" % n for n in range(100)]
+    def concat(n):
+        toCall = calls[n % 100]
+        message = re.sub(r'[{:]','',texts[n % 100]).encode('ascii','ignore').decode('ascii')[:67]
+        return ("PPRAA>APP614"+",TCPIP*::"+toCall.ljust(9, " ")+":"+message+"{"+str(n)).encode("utf-8")
+    def encoder(n):
+        return FrameEncoder.message("PPRAA", calls[n % 100], FrameEncoder.split(texts[n % 100])[0], n)
+    result = {}
+    for name, build in (("concat", concat), ("encoder", encoder)):
+        start = time.perf_counter()
+        for n in range(count):
+            build(n)
+        result[name] = (time.perf_counter()-start)/count*10**6 #microseconds per frame
+    return result
+
+def lookupBench(count: int, stations: int, scans: int = 100) -> dict:
+    #the check every inbound Discord message goes through (GatewaySink.relayable), and the lookup at
+    #its heart: which station is this thread for? Against the scan over every station it replaced.
+    #Lookups are spread evenly over every thread, so the scan is timed over the whole range too.
+    registry = StationRegistry(size=stations)
+    lastHeard = {}
+    for n in range(stations):
+        registry.rememberThread("PPRAA", "BN%05d" % n, 10**6+n)
+        lastHeard["BN%05d" % n] = {"thread": 10**6+n}
+    def spread(lookups):
+        return [10**6+n*stations//lookups for n in range(lookups)]
+    def scan(threadId):
+        if any(station["thread"] == threadId for station in lastHeard.values()):
+            return next(call for call, station in lastHeard.items() if station["thread"] == threadId)
+    client = DiscordClient("aprsbot", intents=discord.Intents(guilds=True), stations=registry, requiredRoles=["Members"], maxStations=stations)
+    client.router = Router.parse(["PPRAA=1"])
+    guild = types.SimpleNamespace(id=1, name="club", roles=[types.SimpleNamespace(name="Members", id=10)])
+    member = types.SimpleNamespace(id=5, nick="Someone | K1ABC", guild=guild, roles=[types.SimpleNamespace(id=10)])
+    parent = types.SimpleNamespace(id=1)
+    def check(threadId):
+        channel = types.SimpleNamespace(id=threadId, name=registry.callsignForThread(threadId)+" via APRS", parent=parent)
+        message = types.SimpleNamespace(author=member, reference=None, channel=channel, content="hello")
+        start = time.perf_counter()
+        assert GatewaySink.relayable(client, message)
+        return time.perf_counter()-start
+    result = {"stations": stations}
+    for name, lookup, threadIds in (("index", registry.callsignForThread, spread(count)), ("scan", scan, spread(min(count, scans)))):
+        start = time.perf_counter()
+        for threadId in threadIds:
+            lookup(threadId)
+        result[name] = (time.perf_counter()-start)/len(threadIds)*10**6 #microseconds per lookup
+    result["check"] = sum(map(check, spread(count)))/count*10**6
+    start = time.perf_counter()
+    for n in range(count):
+        registry.threadFor("PPRAA", "BN%05d" % (n*stations//count))
+    result["threadFor"] = (time.perf_counter()-start)/count*10**6
+    return result
+
+class RingDict(dict):
+    #what APRSClient and DiscordClient used before LRUCache (with collections.abc, so it still imports):
+    #the oldest insertion falls off, however recently it was used
+    def __init__(self, size: int = 10, other=None, **kwargs):
+        super().__init__()
+        self.size = size
+        self.update(other, **kwargs)
+
+    def __setitem__(self, key, value):
+        if len(self)>=self.size: #gotta make room for the new value
+            self.pop(next(iter(self))) #pop the oldest
+        super().__setitem__(key, value)
+
+    def update(self, other=None, **kwargs):
+        if other is not None:
+            for k, v in other.items() if isinstance(other, collections.abc.Mapping) else other:
+                self[k] = v
+        for k, v in kwargs.items():
+            self[k] = v
+
+def cacheBench(count: int, size: int = 10, seed: int = 1) -> dict:
+    #lastHeard traffic: a few stations in a long conversation, among many heard once or twice.
+    #Each packet looks its station up, and updates it in place if it's there, or adds it if not.
+    rng = random.Random(seed)
+    regulars = ["REG%02d" % n for n in range(size//2)]
+    calls = [rng.choice(regulars) if rng.random() < 0.5 else "ONE%06d" % rng.randrange(count) for n in range(count)]
+    result = {"packets": count, "size": size}
+    for name, make in (("lru", lambda: LRUCache(size=size)), ("ring", lambda: RingDict(size=size))):
+        cache = make()
+        regularHits = regularLookups = 0
+        start = time.perf_counter()
+        for call in calls:
+            entry = cache.get(call)
+            if entry is None:
+                cache[call] = {"nextMsgNo": 1}
+            else:
+                entry.update(nextMsgNo=entry["nextMsgNo"]+1)
+            if call[:3] == "REG":
+                regularLookups += 1
+                regularHits += entry is not None
+        result[name] = (time.perf_counter()-start)/count*10**6 #microseconds per packet
+        result[name+"_regulars"] = regularHits/regularLookups*100 #% of the time a regular was remembered
+    return result
+
+def memoryBench(stations: int, remembered: int) -> dict:
+    #bytes per station once every station has a thread, a message number and `remembered` messages
+    #in its dedup window, as the bridge leaves them; against the two lastHeard maps of nested dicts
+    #the bots kept before the registry (a set of every ACK we'd had, and the thread on the other side)
+    dedup = Dedup.Dedup()
+    def registry():
+        stationRegistry = StationRegistry(size=stations)
+        for n in range(stations):
+            callsign = "BN%05d" % n
+            stationRegistry.rememberThread("PPRAA", callsign, 10**17+n)
+            station = stationRegistry.get(callsign)
+            station.takeMsgNo()
+            for msgNo in range(remembered):
+                dedup.remember(station, Dedup.key({"msgNo": str(msgNo), "message_text": "message %d from %s" % (msgNo, callsign)}))
+                stationRegistry.save(station)
+        return stationRegistry
+    def nested():
+        aprs, discord = {}, {}
+        for n in range(stations):
+            callsign = "BN%05d" % n
+            aprs[callsign] = {"nextMsgNo": 2, "msgNo": remembered, "acks": set(range(1, remembered+1))}
+            discord[callsign] = {"thread": 10**17+n}
+        return aprs, discord
+    result = {"stations": stations, "remembered": remembered}
+    for name, build in (("registry", registry), ("nested", nested)):
+        tracemalloc.start()
+        kept = build()
+        result[name] = tracemalloc.get_traced_memory()[0]/stations
+        tracemalloc.stop()
+        del kept
+    return result
+
+def loggingBench(count: int) -> dict:
+    #the log calls one inbound message makes, lazily (%-style, as we do) and eagerly (as we used to),
+    #at WARNING and at INFO, to a queued JSON handler writing to /dev/null. Microseconds per packet
+    #on the event loop; the listener thread's share is in "drained".
+    packet = aprslib.parse("K1ABC>APRS,TCPIP*::PPRAA    :load test message{12")
+    log = Log.getLogger("bridge")
+    def lazy():
+        log.info("found a packet on the queue: %s", packet)
+        log.info("Got a message! Here it is: %s: %s... msgno %s", packet['from'], packet['message_text'], packet['msgNo'], extra={"station": packet['from'], "msgNo": packet['msgNo']})
+    def eager():
+        log.info("found a packet on the queue: "+str(packet))
+        log.info(f"Got a message! Here it is: {packet['from']}: {packet['message_text']}... msgno {packet['msgNo']}")
+    result = {"packets": count}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stderr(devnull):
+        for level in ("warning", "info"):
+            for name, calls in (("lazy", lazy), ("eager", eager)):
+                Log.setup(level, asJSON=True, queued=True)
+                start = time.perf_counter()
+                for n in range(count):
+                    calls()
+                result[level+"_"+name] = (time.perf_counter()-start)/count*10**6
+                Log.shutdown()
+                result[level+"_"+name+"_drained"] = (time.perf_counter()-start)/count*10**6
+    return result
+
+def prefilterBench(lines: list, botCall: str) -> dict:
+    #every line parsed, against only the ones the pre-filter keeps (and the pre-filter itself)
+    def parse(line):
+        try:
+            return aprslib.parse(line)
+        except (aprslib.ParseError, aprslib.UnknownFormat):
+            return None
+    packetFilter = PacketFilter([botCall])
+    result = {"lines": len(lines)}
+    for name, handle in (("parse", parse), ("prefilter", lambda line: packetFilter.classify(line) and parse(line))):
+        start = time.perf_counter()
+        for line in lines:
+            handle(line)
+        result[name] = len(lines)/(time.perf_counter()-start) #lines per second
+    result["kept"] = sum(count for kind, count in packetFilter.counts.items() if kind in ("message", "ack", "rej", "thirdparty"))
+    return result
+
+async def writeBench(count: int, stations: int = 1000) -> dict:
+    #station records saved as fast as we can, the way the bridge saves them: put() on the event
+    #loop, and (for sqlite) flushed in batches behind it. Counted until they're all on disk.
+    result = {"writes": count}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, state in (("memory", MemoryStateStore(size=stations)), ("sqlite", SqliteStateStore(os.path.join(directory, "state.db")))):
+            await state.start()
+            start = time.perf_counter()
+            for n in range(count):
+                state.put("station", "BN%05d" % (n % stations), {"seen": None, "nextMsgNo": n, "threads": {"PPRAA": 10**6+n % stations}})
+                if n % 100 == 99:
+                    await asyncio.sleep(0) #let the flusher in, like packets arriving would
+            putting = time.perf_counter()-start
+            await state.close()
+            result[name] = count/(time.perf_counter()-start) #writes per second, all the way to disk
+            result[name+"_put_us"] = putting/count*10**6
+    return result
+
+async def readBench(count: int, botCall: str) -> dict:
+    #raw lines through APRSIS as fast as the fake server (in this same process) can write them
+    server = FakeAPRSIS(synthetic(botCall, 1000, max(1, count//1500), 0.5, 0)[:count], rate=float("inf"))
+    port = await server.start()
+    ais = APRSIS(botCall, host="127.0.0.1", port=port)
+    start = time.perf_counter()
+    await ais.connect()
+    for read in range(1, len(server.lines)+1):
+        await ais.readline()
+    elapsed = time.perf_counter()-start
+    await ais.close()
+    await server.close()
+    return {"lines": read, "seconds": elapsed, "lines_per_second": read/elapsed}
+
+async def loopLoad(seconds: float, tick: float = 0.01) -> dict:
+    #CPU used, and how late a timer that wants to run every `tick` seconds is, over `seconds`
+    lags = []
+    cpu, start = time.process_time(), time.monotonic()
+    while time.monotonic()-start < seconds:
+        due = time.monotonic()+tick
+        await asyncio.sleep(tick)
+        lags.append(time.monotonic()-due)
+    return {"cpu": (time.process_time()-cpu)/(time.monotonic()-start), "lag_p99": percentile(lags, 0.99)}
+
+async def ackBench(count: int, settle: float = 2) -> dict:
+    #`count` messages, each to its own station, all waiting on their ACKs; then every ACK at once
+    client = APRSClient(None, "PPRAA", txRate=10**9, txBurst=10**9, maxStations=count)
+    wokeAt = {}
+    async def send(toCall):
+        await client.send_aprs_frame(toCall, b"ping", None)
+        wokeAt[toCall] = time.monotonic()
+    calls = ["BN%05d" % n for n in range(count)]
+    baseline = await loopLoad(settle) #the measuring itself, with nothing waiting
+    tasks = [asyncio.create_task(send(toCall)) for toCall in calls]
+    while len(client.pendingAcks) < count:
+        await asyncio.sleep(0.01)
+    idle = await loopLoad(settle)
+    ackedAt = {}
+    start = time.monotonic()
+    for toCall in calls:
+        ackedAt[toCall] = time.monotonic()
+        client.handle_ack(toCall, client.station(toCall).nextMsgNo-1)
+    await asyncio.gather(*tasks)
+    wakeups = [wokeAt[toCall]-ackedAt[toCall] for toCall in calls]
+    return {
+        "messages": count,
+        "baseline_cpu": baseline["cpu"],
+        "idle_cpu": idle["cpu"],
+        "idle_lag_p99": idle["lag_p99"],
+        "wake_p50": percentile(wakeups, 0.5),
+        "wake_p99": percentile(wakeups, 0.99),
+        "wake_max": max(wakeups),
+        "all_woken": max(wokeAt.values())-start,
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description='Replay APRS-IS traffic into the bridge, offline, and measure it.')
+    parser.add_argument( '-log', '--loglevel', default='warning', help='Logging level for the bridge while it runs')
+    parser.add_argument( '--file', help='Raw APRS-IS lines to replay, one per line. If unset, traffic is synthetic.')
+    parser.add_argument( '--botCall', default="PPRAA", help='The callsign the bridge answers to (and that synthetic traffic is addressed to)')
+    parser.add_argument( '--stations', default="10,100,1000", help='Comma-separated station counts to run, for synthetic traffic')
+    parser.add_argument( '--messages', type=int, default=3, help='Messages per station, for synthetic traffic')
+    parser.add_argument( '--noise', type=float, default=0.5, help='Average lines that aren\'t for us, per message, for synthetic traffic')
+    parser.add_argument( '--duplicates', type=float, default=0.1, help='Fraction of messages retransmitted, for synthetic traffic')
+    parser.add_argument( '--rate', type=float, default=1000, help='Lines per second to replay')
+    parser.add_argument( '--discordLatency', type=float, default=0.05, help='Seconds each fake Discord API call takes')
+    parser.add_argument( '--batchWindow', type=float, default=0.5, help='Passed to the Discord post batcher')
+    parser.add_argument( '--shards', type=int, default=16, help='Passed to the bridge')
+    parser.add_argument( '--parseWorkers', type=int, default=0, help='Passed to the bridge')
+    parser.add_argument( '--dropEvery', type=int, default=0, help='Have the fake server hang up after every this many lines')
+    parser.add_argument( '--backoff', type=float, default=0.1, help='Initial reconnect backoff, in seconds')
+    parser.add_argument( '--drainTimeout', type=float, default=30, help='How long to wait for posts to finish after the last line is sent')
+    parser.add_argument( '--sampleEvery', type=float, default=0.5, help='Seconds between memory samples')
+    parser.add_argument( '--json', action='store_true', help='Print results as JSON instead of a table')
+    parser.add_argument( '--cache', type=int, default=0, help='Instead, compare LRUCache with the old RingDict over this many packets')
+    parser.add_argument( '--memory', type=int, default=0, help='Instead, measure memory per station with this many stations tracked')
+    parser.add_argument( '--logging', type=int, default=0, help='Instead, time the logging for this many packets, at WARNING and at INFO')
+    parser.add_argument( '--prefilter', action='store_true', help='Instead, time parsing the traffic with and without the pre-filter')
+    parser.add_argument( '--writes', type=int, default=0, help='Instead, time this many station writes to each state store')
+    parser.add_argument( '--lookups', type=int, default=0, help='Instead, time this many inbound Discord message checks and thread -> station lookups at each --stations count')
+    parser.add_argument( '--lines', type=int, default=0, help='Instead, time reading this many lines from the fake APRS-IS server')
+    parser.add_argument( '--acks', type=int, default=0, help='Instead, measure this many messages waiting on their ACKs at once')
+    parser.add_argument( '--frames', type=int, default=0, help='Instead, time building this many outbound frames, with FrameEncoder and with plain string concatenation')
+    args = parser.parse_args()
+    Log.setup(args.loglevel, queued=False)
+
+    if args.frames:
+        result = frameBench(args.frames)
+        print(json.dumps(result) if args.json else "%(concat).2fus per frame concatenated, %(encoder).2fus with FrameEncoder" % result)
+        return
+
+    if args.cache:
+        result = cacheBench(args.cache)
+        print(json.dumps(result) if args.json else
+              "%(packets)d packets, size %(size)d: LRUCache %(lru).3fus per packet, regulars remembered %(lru_regulars).0f%% of the time; "
+              "RingDict %(ring).3fus, %(ring_regulars).0f%%" % result)
+        return
+
+    if args.memory:
+        results = [memoryBench(args.memory, remembered) for remembered in (0, 3, 32)]
+        for result in ([] if args.json else results):
+            print("%(stations)d stations, %(remembered)2d messages each: %(registry)6.0f bytes per station in the registry, %(nested)6.0f as nested dicts" % result)
+        if args.json:
+            print(json.dumps(results, indent=2))
+        return
+
+    if args.logging:
+        result = loggingBench(args.logging)
+        print(json.dumps(result) if args.json else
+              "per packet, on the loop (drained):  WARNING %(warning_lazy).2fus lazy, %(warning_eager).2fus eager  "
+              "INFO %(info_lazy).2fus (%(info_lazy_drained).2fus) lazy, %(info_eager).2fus (%(info_eager_drained).2fus) eager" % result)
+        return
+
+    if args.prefilter:
+        result = prefilterBench(traffic(args, int(args.stations.split(',')[-1])), args.botCall)
+        print(json.dumps(result) if args.json else
+              "%(lines)d lines, %(kept)d kept: %(parse).0f lines/s parsing everything, %(prefilter).0f lines/s with the pre-filter" % result)
+        return
+
+    if args.writes:
+        result = await writeBench(args.writes)
+        print(json.dumps(result) if args.json else
+              "%(writes)d writes: %(memory).0f/s in memory (%(memory_put_us).2fus per put), %(sqlite).0f/s to sqlite (%(sqlite_put_us).2fus per put)" % result)
+        return
+
+    if args.lookups:
+        results = [lookupBench(args.lookups, int(count)) for count in args.stations.split(',')]
+        for result in ([] if args.json else results):
+            print("%(stations)7d stations: %(check).2fus per check, %(index).3fus per lookup with the index (%(threadFor).3fus the other way), %(scan).1fus scanning" % result)
+        if args.json:
+            print(json.dumps(results, indent=2))
+        return
+
+    if args.lines:
+        result = await readBench(args.lines, args.botCall)
+        print(json.dumps(result) if args.json else "%(lines)d lines in %(seconds).2fs, %(lines_per_second).0f lines/s" % result)
+        return
+
+    if args.acks:
+        result = await ackBench(args.acks)
+        print(json.dumps(result) if args.json else
+              "%(messages)d waiting: %(idle_cpu).1f%% CPU (%(baseline_cpu).1f%% with none), loop lag p99 %(idle_lag_p99).4fs; "
+              "woken p50 %(wake_p50).6fs p99 %(wake_p99).6fs max %(wake_max).6fs after their ACK, all in %(all_woken).4fs" % dict(result, idle_cpu=result["idle_cpu"]*100, baseline_cpu=result["baseline_cpu"]*100))
+        return
+
+    results = []
+    for stations in ([0] if args.file else [int(count) for count in args.stations.split(',')]):
+        results.append(await run(args, stations))
+        if not args.json:
+            result = results[-1]
+            print("%(stations)6d stations  %(lines)7d lines  %(posted)6d/%(messages)d posted  %(acked)6d acked  %(throughput)8.1f msg/s  "
+                  "post p50 %(latency_p50).3fs p99 %(latency_p99).3fs  ack p50 %(ack_p50).3fs p99 %(ack_p99).3fs  "
+                  "%(drops)d drops (%(reconnect_seconds).2fs down)  %(api_calls)d API calls (%(per_call).1f msg/call)  rss %(rss_start)d -> %(rss_end)d (peak %(rss_peak)d)" % result)
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    asyncio.run(main())
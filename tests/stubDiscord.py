@@ -0,0 +1,97 @@
+#A stub of Discord's REST API on localhost, so discord.py's real HTTP client (rate limits, retries
+#and all) can be pointed at it instead of discord.com. It only knows the routes we use:
+#    GET  /users/@me                      logging in
+#    POST /channels/{id}/messages         posting to a channel or thread
+#Every post is recorded, with how many embeds it carried. Each channel has a bucket of `limit`
+#requests per `per` seconds, reported in X-RateLimit-* headers the way Discord does; going over it
+#gets a 429. failNext makes the next few posts fail with that status instead.
+import contextlib
+import itertools
+import json
+import time
+
+from aiohttp import web
+import discord
+
+def _json(data, status: int = 200, headers: dict = None):
+    #discord.py only decodes a body that's exactly application/json, with no charset
+    return web.Response(body=json.dumps(data).encode("utf-8"), status=status, headers=dict(headers or {}, **{"Content-Type": "application/json"}))
+
+BOT_USER = {"id": "1", "username": "bridge", "discriminator": "0", "avatar": None, "bot": True}
+
+class StubDiscord:
+    def __init__(self, limit: int = 5, per: float = 5):
+        self.limit = limit
+        self.per = per
+        self.posts = []     #(channel id, embeds in the post), in the order they arrived
+        self.requests = 0
+        self.limited = 0    #429s handed out
+        self.failNext = []  #statuses to answer the next posts with
+        self.buckets = {}   #channel id -> [remaining, resets at]
+        self.ids = itertools.count(10**17)
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_get("/api/v10/users/@me", self._me)
+        app.router.add_post("/api/v10/channels/{channel}/messages", self._post)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        return "http://127.0.0.1:%d/api/v10" % site._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        await self.runner.cleanup()
+
+    async def _me(self, request):
+        return _json(BOT_USER)
+
+    def _headers(self, channel: str, bucket) -> dict:
+        return {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(bucket[0]),
+            "X-RateLimit-Reset-After": "%.3f" % max(0, bucket[1]-time.monotonic()),
+            "X-RateLimit-Bucket": "messages-"+channel,
+        }
+
+    async def _post(self, request):
+        self.requests += 1
+        channel = request.match_info["channel"]
+        now = time.monotonic()
+        bucket = self.buckets.get(channel)
+        if bucket is None or bucket[1] <= now:
+            bucket = self.buckets[channel] = [self.limit, now+self.per]
+        if bucket[0] == 0:
+            self.limited += 1
+            retryAfter = bucket[1]-now
+            return _json({"message": "You are being rate limited.", "retry_after": retryAfter, "global": False},
+                status=429, headers=dict(self._headers(channel, bucket), **{"Retry-After": "%.3f" % retryAfter, "X-RateLimit-Scope": "user"}))
+        bucket[0] -= 1
+        if self.failNext:
+            return _json({"message": "stub failure", "code": 0}, status=self.failNext.pop(0), headers=self._headers(channel, bucket))
+        body = json.loads(await request.read() or b"{}")
+        embeds = body.get("embeds") or []
+        self.posts.append((int(channel), len(embeds)))
+        return _json({
+            "id": str(next(self.ids)), "channel_id": channel, "author": BOT_USER, "content": body.get("content") or "",
+            "timestamp": "2024-01-01T00:00:00+00:00", "edited_timestamp": None, "tts": False, "mention_everyone": False,
+            "mentions": [], "mention_roles": [], "attachments": [], "embeds": embeds, "pinned": False, "type": 0,
+        }, headers=self._headers(channel, bucket))
+
+    def embedsPerPost(self) -> float:
+        return sum(embeds for channel, embeds in self.posts)/len(self.posts) if self.posts else 0
+
+@contextlib.asynccontextmanager
+async def client(stub: StubDiscord):
+    #a discord.Client with only its HTTP client logged in (no gateway), whose REST calls all go to the stub
+    base = await stub.start()
+    realBase = discord.http.Route.BASE
+    discord.http.Route.BASE = base
+    bot = discord.Client(intents=discord.Intents.none())
+    try:
+        await bot.http.static_login("stub-token")
+        yield bot
+    finally:
+        await bot.close()
+        discord.http.Route.BASE = realBase
+        await stub.close()
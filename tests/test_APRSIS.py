@@ -0,0 +1,143 @@
+#The asyncio APRS-IS client against a fake server on localhost.
+import asyncio
+
+import pytest
+
+from APRSIS import APRSIS, LoginError
+
+class FakeServer:
+    #greets, answers the login with `logresp`, then writes `lines` (in awkward chunks) and records
+    #everything we send. With hangUp, it closes the connection after the lines instead.
+    def __init__(self, lines=(), logresp="verified, server FAKE", hangUp=False, answerAs=None):
+        self.lines = list(lines)
+        self.logresp = logresp
+        self.answerAs = answerAs #the callsign in logresp, if not the one that logged in
+        self.hangUp = hangUp
+        self.logins = []
+        self.received = []
+        self.connections = 0
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        self.server = await asyncio.start_server(self._handle, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        writer.write(b"# aprsc 2.1.14-fake\r\n")
+        login = (await reader.readline()).decode("ascii").rstrip("\r\n")
+        self.logins.append(login)
+        writer.write(("# logresp "+(self.answerAs or login.split()[1])+" "+self.logresp+"\r\n").encode("ascii"))
+        data = b"".join(line+b"\r\n" for line in self.lines)
+        for start in range(0, len(data), 7): #lines split across writes
+            writer.write(data[start:start+7])
+            await writer.drain()
+        if self.hangUp:
+            writer.close()
+            return
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            self.received.append(line.rstrip(b"\r\n"))
+
+    async def close(self):
+        self.server.close()
+
+def run(test):
+    async def main():
+        await asyncio.wait_for(test(), timeout=10)
+    asyncio.run(main())
+
+def test_login_and_framing():
+    async def test():
+        server = FakeServer([b"# a comment", b"K1ABC>APRS::PPRAA    :one{1", b"K2ABC>APRS::PPRAA    :two{2"])
+        port = await server.start()
+        ais = APRSIS("PPRAA", "12345", host="127.0.0.1", port=port)
+        ais.set_filter("g/PPRAA")
+        await ais.connect()
+        assert ais.connected and ais.verified
+        assert server.logins == ["user PPRAA pass 12345 vers aprs-discord-bot 0.2 filter g/PPRAA"]
+        assert await ais.readline() == b"K1ABC>APRS::PPRAA    :one{1"
+        assert await ais.readline() == b"K2ABC>APRS::PPRAA    :two{2"
+        assert await ais.sendall(b"PPRAA>APP614,TCPIP*::K1ABC    :ack1")
+        await ais.close()
+        await asyncio.sleep(0.05)
+        assert server.received == [b"PPRAA>APP614,TCPIP*::K1ABC    :ack1"]
+        await server.close()
+    run(test)
+
+def test_unverified_login():
+    async def test():
+        server = FakeServer(logresp="unverified, server FAKE")
+        ais = APRSIS("PPRAA", host="127.0.0.1", port=await server.start())
+        await ais.connect()
+        assert ais.connected and not ais.verified
+        await ais.close()
+        await server.close()
+    run(test)
+
+def test_rejected_login():
+    async def test():
+        server = FakeServer(answerAs="N0BODY") #the server answers for someone else
+        ais = APRSIS("PPRAA", host="127.0.0.1", port=await server.start())
+        with pytest.raises(LoginError):
+            await ais.connect()
+        assert not ais.connected
+        await server.close()
+    run(test)
+
+def test_outbox_holds_one_copy_until_connected():
+    async def test():
+        server = FakeServer()
+        ais = APRSIS("PPRAA", host="127.0.0.1", port=await server.start())
+        assert not await ais.sendall(b"first")
+        assert not await ais.sendall(b"second")
+        assert not await ais.sendall(b"first") #a retry of the same line
+        assert list(ais.outbox) == [b"first", b"second"]
+        await ais.connect()
+        await ais.close()
+        await asyncio.sleep(0.05)
+        assert server.received == [b"first", b"second"]
+        await server.close()
+    run(test)
+
+def test_consumer_reconnects():
+    async def test():
+        server = FakeServer([b"K1ABC>APRS::PPRAA    :hello{1"], hangUp=True)
+        ais = APRSIS("PPRAA", host="127.0.0.1", port=await server.start(), backoff=0.01)
+        heard = []
+        async def callback(line):
+            heard.append(line)
+        consumer = asyncio.create_task(ais.consumer(callback))
+        while len(heard) < 2:
+            await asyncio.sleep(0.01)
+        consumer.cancel()
+        await asyncio.gather(consumer, return_exceptions=True)
+        assert heard[:2] == [b"K1ABC>APRS::PPRAA    :hello{1"]*2
+        assert server.connections >= 2
+        await ais.close()
+        await server.close()
+    run(test)
+
+def test_silent_server_is_skipped():
+    #the first server takes our login and then says nothing at all; we should move on to the next
+    async def test():
+        silent = FakeServer()
+        port = await silent.start("127.0.0.1")
+        working = FakeServer([b"K1ABC>APRS::PPRAA    :hello{1"])
+        await working.start("127.0.0.2", port)
+        ais = APRSIS("PPRAA", host="127.0.0.1,127.0.0.2", port=port, keepalive=0.2, backoff=0.01)
+        heard = []
+        async def callback(line):
+            heard.append(line)
+        consumer = asyncio.create_task(ais.consumer(callback))
+        while not heard:
+            await asyncio.sleep(0.01)
+        consumer.cancel()
+        await asyncio.gather(consumer, return_exceptions=True)
+        assert (silent.connections, working.connections) == (1, 1)
+        assert ais.host == "127.0.0.2"
+        await ais.close()
+        await silent.close()
+        await working.close()
+    run(test)
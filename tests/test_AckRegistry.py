@@ -0,0 +1,50 @@
+#Waiting on ACKs: futures keyed by (callsign, msgNo), woken by the ACK itself.
+import asyncio
+
+from AckRegistry import AckRegistry
+from APRSClient import APRSClient
+
+def test_resolve_wakes_the_waiter():
+    async def main():
+        acks = AckRegistry()
+        future = acks.register("n0call-9", 12)
+        assert ("N0CALL-9", "12") in acks
+        assert acks.resolve("N0CALL-9", "12") #ACKs come in as strings, uppercase
+        assert await future is True
+        assert len(acks) == 0
+        assert not acks.resolve("N0CALL-9", "12") #a repeat ACK is ignored
+    asyncio.run(main())
+
+def test_rej_and_discard():
+    async def main():
+        acks = AckRegistry()
+        rejected = acks.register("K1ABC", 1)
+        acks.resolve("K1ABC", 1, acked=False)
+        assert await rejected is False
+        abandoned = acks.register("K1ABC", 2)
+        acks.discard("K1ABC", 2)
+        assert abandoned.cancelled() and len(acks) == 0
+    asyncio.run(main())
+
+def test_stray_ack_creates_nothing():
+    async def main():
+        client = APRSClient(None, "PPRAA")
+        assert not client.handle_ack("K1ABC", "5")
+        assert len(client.stations) == 0
+    asyncio.run(main())
+
+def test_send_returns_as_soon_as_acked():
+    async def main():
+        client = APRSClient(None, "PPRAA", txRate=100, txBurst=100)
+        send = asyncio.create_task(client.send_aprs_msg("K1ABC", "hello"))
+        while not client.transport.sent:
+            await asyncio.sleep(0)
+        assert client.transport.sent[0] == b"PPRAA>APP614,TCPIP*::K1ABC    :hello{1"
+        loop = asyncio.get_running_loop()
+        ackedAt = loop.time()
+        assert client.handle_ack("K1ABC", "1")
+        delivery = await send
+        assert (delivery.acked, delivery.parts) == (1, 1)
+        assert loop.time()-ackedAt < 0.1
+        assert len(client.transport.sent) == 1 #no retry
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+#Our ACKs: double-tapped, merged per message, paced, and off one heap.
+import asyncio
+import time
+
+from AckScheduler import AckScheduler
+
+DELAY = 0.05 #repeatDelay, kept short
+
+class Radio:
+    def __init__(self, fail: int = 0):
+        self.sent = [] #(pkt, label, when)
+        self.fail = fail #how many transmissions to refuse first
+
+    async def transmit(self, pkt, label):
+        if self.fail:
+            self.fail -= 1
+            raise ConnectionError("not connected")
+        self.sent.append((pkt, label, time.monotonic()))
+
+async def settle(scheduler):
+    while len(scheduler):
+        await asyncio.sleep(DELAY/10)
+
+def test_each_ack_is_double_tapped():
+    async def main():
+        radio = Radio()
+        acks = AckScheduler(radio.transmit, repeatDelay=DELAY)
+        start = time.monotonic()
+        acks.schedule("ack12", "PPRAA", "k1abc", 12)
+        await settle(acks)
+        assert [label for _, label, _ in radio.sent] == ["ACK", "ACK (double-tap)"]
+        assert radio.sent[0][2]-start < DELAY
+        assert radio.sent[1][2]-radio.sent[0][2] >= DELAY
+        await acks.close()
+    asyncio.run(main())
+
+def test_acks_still_pending_are_merged():
+    async def main():
+        radio = Radio()
+        acks = AckScheduler(radio.transmit, repeatDelay=DELAY, rate=100)
+        acks.schedule("ack12", "PPRAA", "K1ABC", 12)
+        acks.schedule("ack12", "PPRAA", "k1abc", "12") #before the first tap has gone out
+        assert len(acks) == 1 and len(acks.heap) == 1
+        acks.schedule("ack13", "PPRAA", "K1ABC", 13) #a different message isn't
+        assert len(acks) == 2
+        await settle(acks)
+        assert sorted(pkt for pkt, _, _ in radio.sent) == ["ack12", "ack12", "ack13", "ack13"]
+        await acks.close()
+    asyncio.run(main())
+
+def test_retransmission_rearms_the_double_tap():
+    async def main():
+        radio = Radio()
+        acks = AckScheduler(radio.transmit, repeatDelay=DELAY)
+        acks.schedule("ack12", "PPRAA", "K1ABC", 12)
+        while not radio.sent:
+            await asyncio.sleep(0)
+        #the station didn't hear us and sent it again, while we wait to double-tap
+        await asyncio.sleep(DELAY/2)
+        retried = time.monotonic()
+        acks.schedule("ack12", "PPRAA", "K1ABC", 12)
+        assert len(acks.heap) == 2 #the old double-tap is still on the heap, and is skipped when it comes up
+        await settle(acks)
+        assert [label for _, label, _ in radio.sent] == ["ACK", "ACK", "ACK (double-tap)"]
+        assert radio.sent[1][2]-retried < DELAY/2
+        assert radio.sent[2][2]-radio.sent[1][2] >= DELAY
+        await asyncio.sleep(DELAY) #past where the stale entry was due
+        assert len(radio.sent) == 3 and not acks.heap
+        await acks.close()
+    asyncio.run(main())
+
+def test_acks_are_paced():
+    async def main():
+        radio = Radio()
+        acks = AckScheduler(radio.transmit, repeatDelay=DELAY, taps=1, rate=20, burst=1)
+        for msgNo in range(5):
+            acks.schedule("ack%d" % msgNo, "PPRAA", "K1ABC", msgNo)
+        await settle(acks)
+        gaps = [later[2]-earlier[2] for earlier, later in zip(radio.sent, radio.sent[1:])]
+        assert len(radio.sent) == 5
+        assert min(gaps) >= 0.04 #1/rate, give or take the clock
+        await acks.close()
+    asyncio.run(main())
+
+def test_a_failed_transmission_doesnt_stop_the_rest():
+    async def main():
+        radio = Radio(fail=1)
+        acks = AckScheduler(radio.transmit, repeatDelay=DELAY, taps=1)
+        acks.schedule("ack1", "PPRAA", "K1ABC", 1)
+        acks.schedule("ack2", "PPRAA", "K1ABC", 2)
+        await settle(acks)
+        assert [pkt for pkt, _, _ in radio.sent] == ["ack2"]
+        await acks.close()
+    asyncio.run(main())
+
+def test_close_while_sleeping():
+    async def main():
+        radio = Radio()
+        acks = AckScheduler(radio.transmit, repeatDelay=60)
+        await acks.close() #never started
+        acks.schedule("ack12", "PPRAA", "K1ABC", 12)
+        while not radio.sent:
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.01) #asleep until the double-tap, a minute out
+        await asyncio.wait_for(acks.close(), 1)
+        assert acks.worker is None
+        assert len(radio.sent) == 1
+        #and with nothing at all to wait for
+        acks = AckScheduler(radio.transmit, repeatDelay=DELAY, taps=1)
+        acks.schedule("ack13", "PPRAA", "K1ABC", 13)
+        await settle(acks)
+        await asyncio.sleep(0.01)
+        await asyncio.wait_for(acks.close(), 1)
+    asyncio.run(main())
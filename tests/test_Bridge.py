@@ -0,0 +1,79 @@
+#The bridge only ACKs a message once the sink has posted it, and runs without registering metrics.
+import asyncio
+
+import aprslib
+
+from APRSClient import APRSClient
+from Bridge import Bridge
+import Dedup
+import Metrics
+from Router import Router
+from Sink import Sink, SinkError
+
+class LaterSink(Sink):
+    #posts from a queue, like GatewaySink: deliver() hands back a future for the post
+    def __init__(self):
+        self.posts = []
+
+    async def deliver(self, route, callsign, embed):
+        posted = asyncio.get_running_loop().create_future()
+        self.posts.append((callsign, posted))
+        return posted
+
+class RefusingSink(Sink):
+    async def deliver(self, route, callsign, embed):
+        raise SinkError("no thread")
+
+def message(msgNo: int) -> dict:
+    return aprslib.parse("K1ABC>APRS,TCPIP*::PPRAA    :hello %d{%d" % (msgNo, msgNo))
+
+async def bridged(sink):
+    client = APRSClient(None, "PPRAA")
+    bridge = Bridge(client, Router.parse(["PPRAA=1"]), sink)
+    return client, bridge
+
+async def hear(bridge, packet):
+    bridge.route(packet)
+    if bridge.accept(packet):
+        await bridge.deliver(packet)
+
+def test_acked_only_once_posted():
+    async def main():
+        sink = LaterSink()
+        client, bridge = await bridged(sink)
+        await hear(bridge, message(1))
+        await hear(bridge, message(2))
+        assert len(client.acks) == 0 #queued, not posted yet
+        await hear(bridge, message(1)) #a retransmission while it waits isn't posted twice
+        assert len(sink.posts) == 2
+        sink.posts[0][1].set_result(True)
+        sink.posts[1][1].set_exception(RuntimeError("403 Forbidden"))
+        await asyncio.sleep(0)
+        assert len(client.acks) == 1 #just the first; the station will retry the second
+        station = client.station("K1ABC")
+        assert bridge.dedup.seen(station, Dedup.key(message(1))) and not bridge.dedup.seen(station, Dedup.key(message(2)))
+        assert not bridge.delivering
+        await hear(bridge, message(2)) #and when it does, it's posted again
+        assert len(sink.posts) == 3
+        await client.acks.close()
+    asyncio.run(main())
+
+def test_not_acked_when_the_sink_refuses():
+    async def main():
+        client, bridge = await bridged(RefusingSink())
+        await hear(bridge, message(1))
+        assert len(client.acks) == 0 and not bridge.delivering
+        await client.acks.close()
+    asyncio.run(main())
+
+def test_running_a_bridge_registers_no_metrics():
+    async def main():
+        registered = len(Metrics.REGISTRY)
+        for n in range(2): #replay-bench builds a bridge per run
+            bridge = Bridge(APRSClient(asyncio.Queue(), "PPRAA"), Router.parse(["PPRAA=1"]), LaterSink())
+            running = asyncio.create_task(bridge.run())
+            await asyncio.sleep(0.01)
+            running.cancel()
+            await asyncio.gather(running, return_exceptions=True)
+        assert len(Metrics.REGISTRY) == registered #they're registered once, in main()
+    asyncio.run(main())
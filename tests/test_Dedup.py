@@ -0,0 +1,73 @@
+#Inbound dedup, and reply-ACKs (text{MM}AA) as real aprslib parses them.
+import asyncio
+
+import aprslib
+import pytest
+
+from APRSClient import APRSClient
+from Bridge import Bridge
+import Dedup
+from Router import Router
+from StationRegistry import Station
+
+def parsed(info: str) -> dict:
+    return Dedup.normalize(aprslib.parse("K1ABC>APRS,TCPIP*::PPRAA    :"+info))
+
+@pytest.mark.parametrize("info,text,msgNo,replyAck", [
+    ("hi there{12}34", "hi there", "12", "34"),
+    ("hi{12}", "hi", "12", None),
+    ("hi{ab12", "hi", "ab12", None),
+    ("no number", "no number", None, None),
+])
+def test_normalize_message(info, text, msgNo, replyAck):
+    packet = parsed(info)
+    assert (packet["message_text"], packet.get("msgNo"), packet.get("replyAck")) == (text, msgNo, replyAck)
+
+def test_normalize_ack_with_reply_ack():
+    packet = parsed("ack12}34")
+    assert (packet["response"], packet["msgNo"], packet["replyAck"]) == ("ack", "12", "34")
+
+def test_normalize_text_fallback():
+    #what older aprslib hands us: the whole thing as text
+    packet = Dedup.normalize({"format": "message", "from": "K1ABC", "message_text": "ackMM}AA"})
+    assert (packet["response"], packet["msgNo"], packet["replyAck"]) == ("ack", "MM", "AA")
+    packet = Dedup.normalize({"format": "message", "from": "K1ABC", "message_text": "hello{MM}AA"})
+    assert (packet["message_text"], packet["msgNo"], packet["replyAck"]) == ("hello", "MM", "AA")
+
+def test_reply_ack_resolves_our_message():
+    async def main():
+        client = APRSClient(None, "PPRAA")
+        bridge = Bridge(client, Router.parse(["PPRAA=1"]), None)
+        waiting = client.pendingAcks.register("K1ABC", 34)
+        assert bridge.route(aprslib.parse("K1ABC>APRS,TCPIP*::PPRAA    :thanks{12}34")) == "K1ABC"
+        assert waiting.done() and waiting.result() is True
+        waiting = client.pendingAcks.register("K1ABC", 35)
+        assert bridge.route(aprslib.parse("K1ABC>APRS,TCPIP*::PPRAA    :ack13}35")) is None
+        assert waiting.result() is True
+    asyncio.run(main())
+
+def test_retransmission_is_a_duplicate(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("Dedup.time.time", lambda: now[0])
+    dedup = Dedup.Dedup(window=2, ttl=60)
+    station = Station("K1ABC")
+    first = Dedup.key(parsed("hello{1"))
+    dedup.remember(station, first)
+    assert dedup.seen(station, Dedup.key(parsed("hello{1")))
+    #a reset counter reuses the number with different text
+    assert not dedup.seen(station, Dedup.key(parsed("something else{1")))
+    now[0] += 61
+    assert not dedup.seen(station, first)
+
+def test_window_is_bounded():
+    dedup = Dedup.Dedup(window=3)
+    station = Station("K1ABC")
+    for msgNo in range(10):
+        dedup.remember(station, msgNo)
+    assert list(station.seen[0::2]) == [7, 8, 9]
+    dedup.remember(station, 8) #heard again, so it's the newest
+    assert list(station.seen[0::2]) == [7, 9, 8]
+
+def test_key_tells_msgNo_from_text():
+    assert Dedup.key({"msgNo": "1", "message_text": "2x"}) != Dedup.key({"msgNo": "12", "message_text": "x"})
+    assert Dedup.key({"message_text": "x"}) == Dedup.key({"msgNo": None, "message_text": "x"})
@@ -0,0 +1,72 @@
+#Outbound frames against the message format in APRS 1.0.1, chapter 14, and against aprslib's parser.
+import aprslib
+import pytest
+
+import FrameEncoder
+
+def test_message_golden():
+    frame = FrameEncoder.message("PPRAA", "N0CALL-9", FrameEncoder.sanitize("Hello there"), 42)
+    assert frame == b"PPRAA>APP614,TCPIP*::N0CALL-9 :Hello there{42"
+
+def test_ack_rej_golden():
+    assert FrameEncoder.ack("PPRAA", "AD8IS-10", "7") == b"PPRAA>APP614,TCPIP*::AD8IS-10 :ack7"
+    assert FrameEncoder.rej("PPRAA", "AD8IS-10", 12345) == b"PPRAA>APP614,TCPIP*::AD8IS-10 :rej12345"
+
+def test_addressee_padded_to_nine():
+    #including one that's exactly nine, which gets no padding
+    assert FrameEncoder.header("A", "K1") == b"A>APP614,TCPIP*::K1       :"
+    assert FrameEncoder.header("A", "KD2ABC-15") == b"A>APP614,TCPIP*::KD2ABC-15:"
+
+@pytest.mark.parametrize("text,expected", [
+    ("plain", b"plain"),
+    ("no {braces} | pipes ~ tildes", b"no braces} pipes tildes"),
+    ("time: 12:30", b"time 1230"),
+    ("line1\nline2\r\nline3\tx", b"line1 line2 line3 x"),
+    ("  spaced   out  ", b"spaced out"),
+    ("bell\x07 and del\x7f", b"bell and del"),
+    ("café \U0001f4e1", b"caf"),
+])
+def test_sanitize(text, expected):
+    assert FrameEncoder.sanitize(text) == expected
+
+def test_sanitized_text_is_legal():
+    #every byte printable ASCII, and none of the ones the spec reserves
+    clean = FrameEncoder.sanitize("".join(map(chr, range(256))))
+    assert all(0x20 <= byte < 0x7f for byte in clean)
+    assert not set(clean) & set(b"{|~:")
+
+def test_split_short_is_one_frame():
+    assert FrameEncoder.split("x"*67) == [b"x"*67]
+
+def test_split_long_numbers_the_parts():
+    text = " ".join("word%02d" % number for number in range(40))
+    parts = FrameEncoder.split(text)
+    assert len(parts) > 1
+    assert all(len(part) <= FrameEncoder.MAX_TEXT for part in parts)
+    assert all(part.startswith(b"(%d/%d) " % (number, len(parts))) for number, part in enumerate(parts, 1))
+    #nothing lost, and words aren't broken
+    assert b" ".join(part.split(b" ", 1)[1] for part in parts) == text.encode("ascii")
+
+def test_split_ten_or_more_parts():
+    #"(10/12) " is a character longer than "(9/9) ", and the parts still have to fit
+    parts = FrameEncoder.split("y"*700)
+    assert len(parts) >= 10
+    assert all(len(part) <= FrameEncoder.MAX_TEXT for part in parts)
+    assert b"".join(part.split(b" ", 1)[1] for part in parts) == b"y"*700
+
+def test_split_nothing_left():
+    assert FrameEncoder.split("{|~") == [b""]
+
+def test_aprslib_parses_our_frames():
+    packet = aprslib.parse(FrameEncoder.message("PPRAA", "N0CALL-9", b"Hello there", 42).decode("ascii"))
+    assert (packet["format"], packet["from"], packet["addresse"]) == ("message", "PPRAA", "N0CALL-9")
+    assert (packet["message_text"], packet["msgNo"]) == ("Hello there", "42")
+    packet = aprslib.parse(FrameEncoder.ack("PPRAA", "N0CALL-9", 42).decode("ascii"))
+    assert (packet["response"], packet["msgNo"]) == ("ack", "42")
+
+@pytest.mark.parametrize("nick,callsign", [
+    ("Brian | ad8is", "AD8IS"),
+    ("Someone |  KD2ØAB-7 ", "KD20AB-7"),
+])
+def test_callsignFromNick(nick, callsign):
+    assert FrameEncoder.callsignFromNick(nick) == callsign
@@ -0,0 +1,123 @@
+#LRUCache against a plain model of what it should hold: random operations, checked after every step.
+import collections
+import random
+
+import pytest
+
+from LRUCache import LRUCache
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr("LRUCache.time.monotonic", clock)
+    return clock
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_model(seed):
+    #no ttl: it holds exactly the `size` most recently used keys, with the right values
+    rng = random.Random(seed)
+    size = rng.randint(1, 8)
+    evicted = []
+    cache = LRUCache(size=size, onEvict=lambda key, value: evicted.append((key, value)))
+    model = collections.OrderedDict() #oldest first
+    for step in range(500):
+        key = rng.randrange(12)
+        op = rng.choice(("get", "set", "touch", "del", "contains"))
+        if op == "set":
+            value = rng.random()
+            cache[key] = value
+            model[key] = value
+            model.move_to_end(key)
+            if len(model) > size:
+                assert evicted.pop() == model.popitem(last=False)
+        elif op == "get":
+            assert cache.get(key) == model.get(key)
+            if key in model:
+                model.move_to_end(key)
+        elif op == "touch":
+            assert cache.touch(key) == (key in model)
+            if key in model:
+                model.move_to_end(key)
+        elif op == "del":
+            if key in model:
+                del cache[key]
+                del model[key]
+            else:
+                with pytest.raises(KeyError):
+                    del cache[key]
+        else:
+            #looking doesn't refresh
+            assert (key in cache) == (key in model)
+        assert list(cache) == list(model)
+        assert len(cache) == len(model) <= size
+        assert not evicted #explicit deletes aren't evictions
+
+@pytest.mark.parametrize("seed", range(20))
+def test_ttl_matches_model(seed, clock):
+    #with a ttl, an item is gone once it's that old since it was last set or touched (but not read).
+    #there's room for every key, so nothing is pushed out for space
+    rng = random.Random(seed)
+    ttl = 10
+    evicted = []
+    cache = LRUCache(size=8, ttl=ttl, onEvict=lambda key, value: evicted.append(key))
+    model = collections.OrderedDict() #key -> (value, expires), oldest first
+    for step in range(500):
+        clock.now += rng.choice((0, 0, 1, 3, 7))
+        for key, (value, expires) in list(model.items()):
+            if expires <= clock.now:
+                del model[key] #(the cache only notices later)
+        key = rng.randrange(8)
+        op = rng.choice(("get", "set", "touch", "contains", "expire"))
+        if op == "set":
+            value = rng.random()
+            cache[key] = value
+            model[key] = (value, clock.now+ttl)
+            model.move_to_end(key)
+        elif op == "get":
+            assert cache.get(key) == (model[key][0] if key in model else None)
+            if key in model:
+                model.move_to_end(key)
+        elif op == "touch":
+            assert cache.touch(key) == (key in model)
+            if key in model:
+                model[key] = (model[key][0], clock.now+ttl)
+                model.move_to_end(key)
+        elif op == "expire":
+            cache.expire()
+        else:
+            assert (key in cache) == (key in model)
+        assert list(cache) == list(model)
+        assert set(model) <= set(cache.data) #expired ones may linger until they're noticed
+        assert not set(evicted) & set(model) #and only expired ones are dropped
+        evicted.clear()
+
+def test_expire_calls_onEvict(clock):
+    evicted = []
+    cache = LRUCache(size=10, ttl=5, onEvict=lambda key, value: evicted.append((key, value)))
+    cache["a"], cache["b"] = 1, 2
+    clock.now += 3
+    cache["c"] = 3
+    clock.now += 3
+    cache.expire()
+    assert evicted == [("a", 1), ("b", 2)]
+    assert list(cache.data) == ["c"]
+
+def test_nested_update_counts_as_use():
+    #lastHeard[call].update(...) reads the item, so it's the newest afterwards
+    cache = LRUCache(size=2)
+    cache["old"] = {}
+    cache["new"] = {}
+    cache["old"].update(x=1)
+    cache["newer"] = {}
+    assert list(cache) == ["old", "newer"]
+
+def test_initial_items():
+    cache = LRUCache(size=2, other={"a": 1}, b=2)
+    assert dict(cache) == {"a": 1, "b": 2}
@@ -0,0 +1,83 @@
+#Structured, lazy, queued logging.
+import json
+import logging
+
+import pytest
+
+import Log
+
+@pytest.fixture
+def restoreLogging():
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    yield
+    Log.shutdown()
+    root.handlers[:] = handlers
+    root.setLevel(level)
+    for subsystem in Log.SUBSYSTEMS:
+        Log.getLogger(subsystem).setLevel(logging.NOTSET)
+
+def records(capsys) -> list:
+    return [json.loads(line) for line in capsys.readouterr().err.splitlines()]
+
+def test_json_records_through_the_queue(restoreLogging, capsys):
+    Log.setup("info", asJSON=True, queued=True)
+    log = Log.getLogger("bridge")
+    log.info("Got a message from %s", "K1ABC", extra={"station": "K1ABC", "msgNo": "12"})
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        log.exception("it broke")
+    Log.shutdown() #flushes the queue
+    first, second = records(capsys)
+    assert (first["logger"], first["level"], first["message"]) == ("aprsbot.bridge", "INFO", "Got a message from K1ABC")
+    assert (first["station"], first["msgNo"]) == ("K1ABC", "12")
+    assert "ValueError: boom" in second["exception"] #not lost on the way
+
+def test_records_are_what_was_logged(restoreLogging, capsys):
+    #the loop goes on changing what it logged while the record waits on the queue
+    Log.setup("info", asJSON=True, queued=True)
+    packet = {"from": "K1ABC"}
+    Log.getLogger("aprs").info("got %s", packet, extra={"packet": packet})
+    packet["from"] = "W1XYZ"
+    Log.shutdown()
+    (record,) = records(capsys)
+    assert record["message"] == "got {'from': 'K1ABC'}"
+    assert record["packet"] == "{'from': 'K1ABC'}"
+
+def test_plain_text_through_the_queue(restoreLogging, capsys):
+    Log.setup("info", queued=True)
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        Log.getLogger("bridge").exception("it broke for %s", "K1ABC")
+    Log.shutdown()
+    err = capsys.readouterr().err
+    assert "aprsbot.bridge: it broke for K1ABC" in err
+    assert err.count("ValueError: boom") == 1
+
+def test_filtered_records_are_never_formatted(restoreLogging, capsys):
+    formatted = []
+    class Packet:
+        def __str__(self):
+            formatted.append(self)
+            return "a packet"
+    Log.setup("warning", asJSON=True, queued=True)
+    Log.getLogger("aprs").info("found a packet on the queue: %s", Packet())
+    Log.getLogger("aprs").warning("this one is: %s", Packet())
+    Log.shutdown()
+    assert len(formatted) == 1
+    assert [record["message"] for record in records(capsys)] == ["this one is: a packet"]
+
+def test_levels_per_subsystem(restoreLogging, capsys):
+    Log.setup("warning", asJSON=True, queued=False, levels={"discord": "info"})
+    Log.getLogger("discord").info("loud")
+    Log.getLogger("aprs").info("quiet")
+    assert [record["logger"] for record in records(capsys)] == ["aprsbot.discord"]
+
+def test_setup_twice_keeps_one_listener(restoreLogging, capsys):
+    Log.setup("info", asJSON=True)
+    Log.setup("info", asJSON=True)
+    Log.getLogger("state").info("once")
+    Log.shutdown()
+    assert len(records(capsys)) == 1
@@ -0,0 +1,50 @@
+#The pre-filter keeps exactly the lines aprslib would parse into something for us.
+import aprslib
+import pytest
+
+from PacketFilter import PacketFilter
+
+@pytest.mark.parametrize("line,kind", [
+    ("K1ABC>APRS,TCPIP*::PPRAA    :hello{1", "message"),
+    ("K1ABC>APRS,TCPIP*::PPRAA-1  :hello", "message"),
+    ("K1ABC>APRS,TCPIP*::ppraa    :lowercase{2", "message"),
+    ("K1ABC>APRS,TCPIP*::PPRAA    :ack12", "ack"),
+    ("K1ABC>APRS,TCPIP*::PPRAA    :rej12", "rej"),
+    ("K1ABC>APRS,TCPIP*::PPRAA    :ack12}34", "message"), #a reply-ACK; normalize() sorts that out
+    ("K1ABC>APRS,TCPIP*::PPRAA    :acknowledged, thanks", "message"),
+    ("K1ABC>APRS,TCPIP*:}K2ABC>APRS,TCPIP,K1ABC*::PPRAA    :gated{3", "thirdparty"),
+    ("K1ABC>APRS,TCPIP*::N0CALL   :not for us{1", None),
+    ("K1ABC>APRS,TCPIP*::PPRAAB   :nearly for us{1", None),
+    ("K1ABC>APRS,TCPIP*:!4903.50N/07201.75W-a position", None),
+    ("K1ABC>APRS,TCPIP*::PPRAA:too short", None),
+    ("no header at all", None),
+    (">APRS::PPRAA    :no source", None),
+])
+def test_classify(line, kind):
+    packetFilter = PacketFilter(["PPRAA", "PPRAA-1"])
+    assert packetFilter.classify(line) == kind
+    assert packetFilter.classify(line.encode("ascii")) == kind #raw bytes off the socket, too
+
+def test_agrees_with_aprslib():
+    #whatever we keep parses as a message to us, and what we drop never would have
+    lines = [
+        "K1ABC>APRS,TCPIP*::PPRAA    :hello{1",
+        "K1ABC>APRS,TCPIP*::PPRAA    :ack12",
+        "K1ABC>APRS,TCPIP*::N0CALL   :hello{1",
+        "K1ABC>APRS,TCPIP*:!4903.50N/07201.75W-a position",
+        "K1ABC>APRS,TCPIP*:>a status",
+    ]
+    packetFilter = PacketFilter(["PPRAA"])
+    for line in lines:
+        try:
+            packet = aprslib.parse(line)
+        except aprslib.ParseError:
+            packet = {}
+        forUs = packet.get("format") == "message" and packet.get("addresse") == "PPRAA"
+        assert (packetFilter.classify(line) is not None) == forUs, line
+
+def test_counts_by_reason():
+    packetFilter = PacketFilter(["PPRAA"])
+    for line in ("K1ABC>APRS::PPRAA    :hi", "K1ABC>APRS::N0CALL   :hi", "K1ABC>APRS:!pos", "junk"):
+        packetFilter.classify(line)
+    assert packetFilter.counts == {"message": 1, "notforme": 1, "notmessage": 1, "malformed": 1}
@@ -0,0 +1,100 @@
+#PostBatcher through discord.py's real HTTP client, against the stub Discord API.
+import asyncio
+import logging
+
+import discord
+
+from PostBatcher import PostBatcher
+from stubDiscord import StubDiscord, client
+
+def embed(number: int) -> discord.Embed:
+    return discord.Embed(title="message %d" % number)
+
+async def drained(batcher: PostBatcher):
+    while batcher.workers:
+        await asyncio.gather(*batcher.workers.values())
+
+def test_burst_is_batched():
+    async def main():
+        stub = StubDiscord()
+        async with client(stub) as bot:
+            batcher = PostBatcher(window=0.05, rate=10, burst=10)
+            thread = bot.get_partial_messageable(1001)
+            for number in range(25):
+                batcher.post(thread, embed(number))
+            await drained(batcher)
+        return stub
+    stub = asyncio.run(main())
+    assert stub.posts == [(1001, 10), (1001, 10), (1001, 5)]
+
+def test_threads_are_batched_separately():
+    async def main():
+        stub = StubDiscord()
+        async with client(stub) as bot:
+            batcher = PostBatcher(window=0.05, rate=10, burst=10)
+            for number in range(12):
+                batcher.post(bot.get_partial_messageable(2000+number%3), embed(number))
+            await drained(batcher)
+        return stub
+    stub = asyncio.run(main())
+    assert sorted(stub.posts) == [(2000, 4), (2001, 4), (2002, 4)]
+    assert stub.embedsPerPost() == 4
+
+def test_paces_itself_under_the_rate_limit():
+    #a bucket of 2 posts a second: we wait our turn instead of collecting 429s
+    async def main():
+        stub = StubDiscord(limit=2, per=1)
+        async with client(stub) as bot:
+            batcher = PostBatcher(window=0, rate=2, burst=2)
+            thread = bot.get_partial_messageable(3001)
+            for number in range(40):
+                batcher.post(thread, embed(number))
+            await drained(batcher)
+        return stub
+    stub = asyncio.run(main())
+    assert [embeds for channel, embeds in stub.posts] == [10, 10, 10, 10]
+    assert stub.limited == 0
+
+def test_failed_post_doesnt_stop_the_rest(caplog):
+    async def main():
+        stub = StubDiscord()
+        stub.failNext = [403]
+        async with client(stub) as bot:
+            batcher = PostBatcher(window=0.05, rate=10, burst=10)
+            thread = bot.get_partial_messageable(4001)
+            posted = [batcher.post(thread, embed(number)) for number in range(15)]
+            await drained(batcher)
+            assert all(isinstance(future.exception(), discord.Forbidden) for future in posted[:10])
+            assert all(future.result() is True for future in posted[10:])
+        return stub
+    with caplog.at_level(logging.WARNING):
+        stub = asyncio.run(main())
+    assert stub.posts == [(4001, 5)] #the first ten were refused
+    assert "Couldn't post 10 messages to thread 4001" in caplog.text
+
+def test_close_lets_the_batch_window_finish():
+    #these may already be ACKed on the APRS side, so close() posts them rather than dropping them
+    async def main():
+        stub = StubDiscord()
+        async with client(stub) as bot:
+            batcher = PostBatcher(window=0.2, rate=10, burst=10)
+            posted = batcher.post(bot.get_partial_messageable(5001), embed(1))
+            await batcher.close(timeout=5)
+            assert posted.result() is True
+            assert not batcher.workers and not batcher.queues
+        return stub
+    assert asyncio.run(main()).posts == [(5001, 1)]
+
+def test_close_gives_up_after_its_timeout(caplog):
+    async def main():
+        stub = StubDiscord()
+        async with client(stub) as bot:
+            batcher = PostBatcher(window=10, rate=10, burst=10)
+            posted = batcher.post(bot.get_partial_messageable(5002), embed(1))
+            await batcher.close(timeout=0.1)
+            assert posted.cancelled()
+        return stub
+    with caplog.at_level(logging.WARNING):
+        stub = asyncio.run(main())
+    assert stub.posts == []
+    assert "Dropped 1 messages for thread 5002" in caplog.text
@@ -0,0 +1,33 @@
+#Who may transmit: members with every required role, and nobody if no roles are configured.
+from types import SimpleNamespace
+
+import pytest
+
+from RoleAuthorizer import RoleAuthorizer
+
+GUILD = SimpleNamespace(id=1, name="club", roles=[SimpleNamespace(name="Members", id=10), SimpleNamespace(name="Hams", id=11)])
+
+def member(memberId: int, *roleIds) -> SimpleNamespace:
+    return SimpleNamespace(id=memberId, guild=GUILD, roles=[SimpleNamespace(id=roleId) for roleId in roleIds])
+
+def test_needs_every_role():
+    authorizer = RoleAuthorizer(["Members", "Hams"])
+    assert authorizer.isAuthorized(member(1, 10, 11, 99))
+    assert not authorizer.isAuthorized(member(2, 10))
+
+def test_missing_role_denies_everyone():
+    authorizer = RoleAuthorizer(["Members", "Nonexistent"])
+    assert not authorizer.isAuthorized(member(1, 10, 11))
+
+@pytest.mark.parametrize("requiredRoles", [[], [""], ["", " "], ",".split(",")])
+def test_no_roles_denies_everyone(requiredRoles):
+    authorizer = RoleAuthorizer(requiredRoles)
+    assert not authorizer.isAuthorized(member(1, 10, 11))
+    assert not authorizer.isAuthorized(member(2))
+
+def test_forgetting_a_member():
+    authorizer = RoleAuthorizer(["Members"])
+    assert not authorizer.isAuthorized(member(1))
+    assert not authorizer.isAuthorized(member(1, 10)) #cached
+    authorizer.forgetMember(member(1))
+    assert authorizer.isAuthorized(member(1, 10))
@@ -0,0 +1,75 @@
+#Outbound messages: in order per station, one outstanding each, a few stations at once.
+import asyncio
+
+from SendScheduler import SendScheduler
+
+class Client:
+    #stands in for APRSClient: each message takes `delay` to be ACKed
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.sent = [] #(toCall, message), as they start
+        self.outstanding = {} #toCall -> messages in flight
+        self.most = 0 #the most in flight at once, over every station
+        self.mostPerStation = 0
+
+    async def send_aprs_msg(self, toCall, message, fromCall=None):
+        if message == "fail":
+            raise ConnectionError("not connected")
+        self.sent.append((toCall, message))
+        self.outstanding[toCall] = self.outstanding.get(toCall, 0)+1
+        self.most = max(self.most, sum(self.outstanding.values()))
+        self.mostPerStation = max(self.mostPerStation, self.outstanding[toCall])
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.outstanding[toCall] -= 1
+        return (toCall, message)
+
+def test_in_order_per_station():
+    async def main():
+        client = Client()
+        scheduler = SendScheduler(client)
+        outcomes = [scheduler.submit("K1ABC", "message %d" % n) for n in range(5)]
+        assert scheduler.queueDepths() == {"K1ABC": 5}
+        assert await asyncio.gather(*outcomes) == [("K1ABC", "message %d" % n) for n in range(5)]
+        assert [message for _, message in client.sent] == ["message %d" % n for n in range(5)]
+        assert client.mostPerStation == 1
+        assert scheduler.queueDepths() == {} and not scheduler.workers
+    asyncio.run(main())
+
+def test_stations_proceed_in_parallel_up_to_the_cap():
+    async def main():
+        client = Client()
+        scheduler = SendScheduler(client, maxConcurrent=2)
+        outcomes = [scheduler.submit("K%dABC" % station, "message %d" % n) for n in range(3) for station in range(6)]
+        await asyncio.gather(*outcomes)
+        assert client.most == 2
+        assert client.mostPerStation == 1
+        for station in range(6):
+            assert [message for toCall, message in client.sent if toCall == "K%dABC" % station] == ["message %d" % n for n in range(3)]
+    asyncio.run(main())
+
+def test_a_failure_doesnt_hold_up_the_queue():
+    async def main():
+        client = Client()
+        scheduler = SendScheduler(client)
+        failed = scheduler.submit("K1ABC", "fail")
+        withdrawn = scheduler.submit("K1ABC", "withdrawn")
+        sent = scheduler.submit("K1ABC", "sent")
+        withdrawn.cancel()
+        assert await sent == ("K1ABC", "sent")
+        assert isinstance(failed.exception(), ConnectionError)
+        assert client.sent == [("K1ABC", "sent")]
+    asyncio.run(main())
+
+def test_close_cancels_whatever_is_queued():
+    async def main():
+        client = Client(delay=60)
+        scheduler = SendScheduler(client)
+        outcomes = [scheduler.submit("K1ABC", "message %d" % n) for n in range(3)]
+        while not client.sent:
+            await asyncio.sleep(0)
+        await asyncio.wait_for(scheduler.close(), 1)
+        assert all(outcome.cancelled() for outcome in outcomes) #the one in flight too
+        assert not scheduler.workers and not scheduler.queues
+    asyncio.run(main())
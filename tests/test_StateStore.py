@@ -0,0 +1,67 @@
+#Both state stores: what's put is what's got, and SqliteStateStore keeps it across a restart.
+import asyncio
+
+from StateStore import MemoryStateStore, SqliteStateStore
+
+def test_memory_store_is_bounded():
+    state = MemoryStateStore(size=2)
+    for call in ("K1ABC", "K2ABC", "K3ABC"):
+        state.put("station", call, {"nextMsgNo": 1})
+    assert state.get("station", "K1ABC") is None
+    assert state.get("station", "K3ABC") == {"nextMsgNo": 1}
+    state.delete("station", "K3ABC")
+    assert state.get("station", "K3ABC") is None
+
+def test_sqlite_survives_a_restart(tmp_path):
+    path = str(tmp_path/"state.db")
+    async def first():
+        state = SqliteStateStore(path, flushInterval=60)
+        await state.start()
+        state.put("station", "K1ABC", {"nextMsgNo": 5})
+        state.put("station", "K2ABC", {"nextMsgNo": 6})
+        state.delete("station", "K2ABC")
+        assert state.get("station", "K1ABC") == {"nextMsgNo": 5} #before it's been written
+        await state.close() #writes what's pending
+    async def second():
+        state = SqliteStateStore(path)
+        await state.start()
+        assert state.get("station", "K1ABC") == {"nextMsgNo": 5}
+        assert state.get("station", "K2ABC") is None
+        assert state.get("discord/PPRAA", "K1ABC") is None #namespaces are separate
+        await state.close()
+    asyncio.run(first())
+    asyncio.run(second())
+
+def test_sqlite_reads_its_writes_during_a_flush(tmp_path):
+    async def main():
+        state = SqliteStateStore(str(tmp_path/"state.db"))
+        state.put("station", "K1ABC", {"nextMsgNo": 1})
+        await state.flush()
+        state.put("station", "K1ABC", {"nextMsgNo": 2})
+        flush = asyncio.create_task(state.flush())
+        await asyncio.sleep(0) #the batch is on its way to the database, but may not be there yet
+        assert state.get("station", "K1ABC") == {"nextMsgNo": 2}
+        await flush
+        assert state.get("station", "K1ABC") == {"nextMsgNo": 2}
+        await state.close()
+    asyncio.run(main())
+
+def test_sqlite_flushes_when_enough_is_pending(tmp_path):
+    async def main():
+        state = SqliteStateStore(str(tmp_path/"state.db"), flushInterval=60, maxPending=10)
+        await state.start()
+        for n in range(10):
+            state.put("station", "BN%05d" % n, {"nextMsgNo": n})
+        while state.pending or state.flushing:
+            await asyncio.sleep(0.01)
+        assert state.reader.execute("SELECT COUNT(*) FROM state").fetchone() == (10,)
+        await state.close()
+    asyncio.run(main())
+
+def test_values_are_copies():
+    #a caller changing a station's dict afterwards doesn't change what was saved
+    state = MemoryStateStore()
+    value = {"threads": None}
+    state.put("station", "K1ABC", value)
+    value["threads"] = {"PPRAA": 1}
+    assert state.get("station", "K1ABC") == {"threads": None}
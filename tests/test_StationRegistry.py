@@ -0,0 +1,69 @@
+#Station records: one registry shared by both sides, saved to and restored from the state store.
+import discord
+
+from APRSClient import APRSClient
+from Dedup import Dedup
+from DiscordClient import DiscordClient
+from StateStore import MemoryStateStore
+from StationRegistry import StationRegistry
+
+def test_clients_share_an_empty_registry():
+    #an empty registry is falsy (it has a __len__), and it must still be the one that's used
+    stations = StationRegistry()
+    assert len(stations) == 0
+    aprs = APRSClient(None, "PPRAA", stations=stations)
+    bot = DiscordClient("PPRAA", intents=discord.Intents.none(), stations=stations)
+    assert aprs.stations is stations and bot.stations is stations
+    aprs.station("K1ABC").takeMsgNo()
+    assert bot.stations.get("K1ABC").nextMsgNo == 2
+
+def test_restored_from_the_state_store():
+    state = MemoryStateStore()
+    stations = StationRegistry(state, size=2)
+    station = stations.get("K1ABC")
+    station.takeMsgNo()
+    stations.rememberThread("PPRAA", "K1ABC", 555)
+    again = StationRegistry(state).get("K1ABC")
+    assert (again.nextMsgNo, again.threads) == (2, {"PPRAA": 555})
+
+def test_eviction_keeps_the_thread_index():
+    stations = StationRegistry(MemoryStateStore(), size=2)
+    stations.rememberThread("PPRAA", "K1ABC", 1)
+    stations.rememberThread("PPRAA", "K2ABC", 2)
+    assert stations.callsignForThread(1) == "K1ABC"
+    stations.get("K3ABC") #pushes K1ABC out of memory
+    assert stations.callsignForThread(1) is None
+    assert stations.threadFor("PPRAA", "K1ABC") == 1 #back from the state store
+    assert stations.callsignForThread(1) == "K1ABC"
+
+def test_memory_only_keeps_no_copy():
+    #without a state store, a station that's pushed out is simply forgotten
+    stations = StationRegistry(size=1)
+    stations.get("K1ABC").takeMsgNo()
+    stations.save(stations.get("K1ABC"))
+    stations.get("K2ABC")
+    assert stations.get("K1ABC").nextMsgNo == 1
+
+def test_seen_window_round_trips():
+    state = MemoryStateStore()
+    stations = StationRegistry(state)
+    dedup = Dedup()
+    station = stations.get("K1ABC")
+    dedup.remember(station, 1234)
+    stations.save(station)
+    again = StationRegistry(state).get("K1ABC")
+    assert again.seen == station.seen and dedup.seen(again, 1234)
+
+def test_moving_a_thread_forgets_the_old_one():
+    stations = StationRegistry()
+    stations.rememberThread("PPRAA", "K1ABC", 1)
+    stations.rememberThread("PPRAA", "K1ABC", 7)
+    assert (stations.callsignForThread(1), stations.callsignForThread(7)) == (None, "K1ABC")
+
+def test_new_stations_start_at_firstMsgNo():
+    state = MemoryStateStore()
+    stations = StationRegistry(state, firstMsgNo=42)
+    assert stations.get("K1ABC").takeMsgNo() == 42
+    stations.save(stations.get("K1ABC"))
+    #what's saved wins over the seed
+    assert StationRegistry(state, firstMsgNo=7).get("K1ABC").nextMsgNo == 43